@@ -0,0 +1,88 @@
+"""Checkpointing of (long) reconstructions such that they can be resumed exactly."""
+# Copyright 2026 University College London
+# Licence: Apache-2.0
+import logging
+import os
+import pickle
+from pathlib import Path, PurePath
+from typing import Iterable
+
+import sirf.STIR as STIR
+from cil.optimisation.algorithms import Algorithm
+from cil.optimisation.utilities import callbacks as cil_callbacks
+
+log = logging.getLogger('petric')
+
+STATE = ("iteration", "iterations", "loss", "subset")
+"""
+Default (dotted) attribute names of the algorithm state saved in addition to `algo.x`.
+This includes `subset` (as used by `BSREM1`), while the step-size schedule of `BSREM1` is determined by `iteration`.
+Add e.g. "f.function.sampler" for the sampler (including its RNG state) of an `SGFunction`.
+"""
+
+
+def _getattr(obj, name: str):
+    for attr in name.split('.'):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def _setattr(obj, name: str, value):
+    *parents, attr = name.split('.')
+    for parent in parents:
+        obj = getattr(obj, parent)
+    if isinstance(current := getattr(obj, attr, None), list) and isinstance(value, list):
+        current[:] = value # e.g. CIL `Algorithm.loss` is a read-only property
+    else:
+        setattr(obj, attr, value)
+
+
+def save_checkpoint(algo: Algorithm, outdir: PurePath, attributes: Iterable[str] = STATE):
+    """
+    Save `algo.x` and `attributes` of `algo` in `outdir/checkpoint`.
+    Alternates between 2 slots, only updating `checkpoint/latest` after a slot is complete,
+    such that there is always a valid checkpoint (even if interrupted while saving).
+    """
+    chkdir = Path(outdir) / 'checkpoint'
+    latest = chkdir / 'latest'
+    slot = 'b' if latest.is_file() and latest.read_text().strip() == 'a' else 'a'
+    (slotdir := chkdir / slot).mkdir(parents=True, exist_ok=True)
+    state = {}
+    for name in attributes:
+        try:
+            state[name] = _getattr(algo, name)
+        except AttributeError:
+            log.debug("checkpoint: %s has no attribute %s", type(algo).__name__, name)
+    algo.x.write(str(slotdir / 'x.hv'))
+    with (slotdir / 'state.pkl').open('wb') as fd:
+        pickle.dump(state, fd)
+    (tmp := chkdir / f'latest.{os.getpid()}.tmp').write_text(slot)
+    os.replace(tmp, latest)
+    log.debug("checkpoint: saved iteration %d to %s", algo.iteration, slotdir)
+
+
+def load_checkpoint(algo: Algorithm, outdir: PurePath) -> bool:
+    """Restore the state of `algo` from `outdir/checkpoint` (if present). Returns `True` if restored."""
+    if not (latest := Path(outdir) / 'checkpoint' / 'latest').is_file():
+        return False
+    slotdir = latest.parent / latest.read_text().strip()
+    algo.x.fill(STIR.ImageData(str(slotdir / 'x.hv')))
+    with (slotdir / 'state.pkl').open('rb') as fd:
+        state = pickle.load(fd)
+    for name, value in state.items():
+        _setattr(algo, name, value)
+    log.info("checkpoint: resuming from iteration %d (%s)", algo.iteration, slotdir)
+    return True
+
+
+class Checkpoint(cil_callbacks.Callback):
+    """Calls `save_checkpoint` every `interval` iterations"""
+    def __init__(self, outdir: PurePath, interval: int = 100, attributes: Iterable[str] = STATE, **kwargs):
+        super().__init__(**kwargs)
+        self.outdir = outdir
+        self.interval = interval
+        self.attributes = tuple(attributes)
+
+    def __call__(self, algo: Algorithm):
+        if algo.iteration > 0 and algo.iteration % self.interval == 0:
+            save_checkpoint(algo, self.outdir, self.attributes)
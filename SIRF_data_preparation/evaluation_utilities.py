@@ -1,17 +1,25 @@
 """Some utilities for plotting objectives and metrics."""
 import csv
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path, PurePath
 from typing import Iterable
 
 import matplotlib.pyplot as plt
 import numpy as np
 
 import sirf.STIR as STIR
-from petric import QualityMetrics
+from petric import IterationStore, QualityMetrics, read_interfile, read_run_log
 
 
 def read_objectives(datadir='.'):
-    """Reads objectives.csv and returns as 2d array"""
+    """Reads objectives (from the `RunLog` if present, otherwise objectives.csv) and returns as 2d array"""
+    if (Path(datadir) / 'runlog.json').is_file():
+        run_log = read_run_log(datadir)
+        # skip iterations whose image was dropped (see `SaveIters.on_full`)
+        if 'saved' in run_log.dtype.names:
+            run_log = run_log[run_log['saved'] > 0]
+        return np.stack((run_log['iter'], run_log['objective']), axis=1)
     with (Path(datadir) / 'objectives.csv').open() as csvfile:
         reader = csv.reader(csvfile)
         next(reader) # skip first (header) line
@@ -23,9 +31,51 @@ def get_metrics_for_images(qm: QualityMetrics, iters: Iterable[STIR.ImageData]):
     return np.asarray([list(qm.evaluate(im).values()) for im in iters])
 
 
-def get_metrics(qm: QualityMetrics, iters: Iterable[int], srcdir='.'):
-    """Read 'iter_{iter_glob}.hv' images from datadir, compute metrics and return as 2d array"""
-    return get_metrics_for_images(qm, (STIR.ImageData(str(Path(srcdir) / f'iter_{i:04d}.hv')) for i in iters))
+def get_metrics(qm: QualityMetrics, iters: Iterable[int], srcdir='.', workers: int = 8, batch_size: int = 32):
+    """
+    Read 'iter_{iter:04d}.hv' images from datadir, compute metrics and return as 2d array
+
+    Images are read directly from the raw Interfile data by `workers` threads
+    and evaluated in batches of `batch_size` (see `QualityMetrics.evaluate_batch`),
+    while the next batch is being read.
+    If `srcdir` contains an `IterationStore` (i.e. saved with `SaveIters(storage="chunked")`), it is read instead.
+    """
+    srcdir = Path(srcdir)
+    store = IterationStore(srcdir) if (srcdir / 'iterations.json').is_file() else None
+    if store is None:
+        read, sources = read_interfile, iter([srcdir / f'iter_{i:04d}.hv' for i in iters])
+    else:
+        read, sources = store.read, iter(iters)
+    metrics = []
+    try:
+        with ThreadPoolExecutor(workers) as pool:
+            pending = [pool.submit(read, source) for source in islice(sources, batch_size)]
+            while pending:
+                batch = np.stack([future.result() for future in pending])
+                pending = [pool.submit(read, source) for source in islice(sources, batch_size)]
+                metrics.append(qm.evaluate_batch(batch))
+    finally:
+        if store is not None:
+            store.close()
+    return np.concatenate(metrics) if metrics else np.empty((0, len(qm.keys())))
+
+
+def score_runs(qm: QualityMetrics, runs: dict[str, tuple[PurePath, Iterable[int]]], window: int = 10,
+               **kwargs) -> dict[str, tuple[np.ndarray, int | None]]:
+    """
+    Compute metrics of saved iterations of multiple runs `{name: (srcdir, iters)}`.
+    Returns `{name: (metrics, pass_index)}` with `pass_index=None` if thresholds are not (yet) passed.
+    `kwargs` are passed to `get_metrics`.
+    """
+    res = {}
+    for name, (srcdir, iters) in runs.items():
+        metrics = get_metrics(qm, iters, srcdir=srcdir, **kwargs)
+        try:
+            idx = QualityMetrics.pass_index(metrics, qm.thresholds(), window)
+        except IndexError:
+            idx = None
+        res[name] = metrics, idx
+    return res
 
 
 def plot_metrics(iters: Iterable[int], m: np.ndarray, labels=None, suffix=""):
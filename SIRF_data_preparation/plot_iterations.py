@@ -74,7 +74,7 @@ settings = get_settings(scanID)
 slices = settings.slices
 cmax = settings.vmax
 # %%
-data = get_data(srcdir=srcdir, outdir=None, read_sinos=False)
+data = get_data(srcdir=srcdir, outdir=None, read_sinos=False, lazy=True)
 # %% find "reference" image (either data.reference_image, or last iteration)
 if data.reference_image is not None:
     print('Using existing reference image')
@@ -166,15 +166,13 @@ if m1 is not None:
     fig.savefig(outdir / f'{scanID}_metrics_{algoname}_cont.png')
 # %%
 try:
-    idx = QualityMetrics.pass_index(m, numpy.array([.01, .01] + [.005 for i in range(len(data.voi_masks))]),
-                                    max(10 // iteration_interval, 2))
+    idx = QualityMetrics.pass_index(m, qm.thresholds(), max(10 // iteration_interval, 2))
     iter = iters[idx]
     pass_datadir = datadir
     print('pass index (original run): ', iter)
 except Exception:
     try:
-        idx = QualityMetrics.pass_index(m1, numpy.array([.01, .01] + [.005 for i in range(len(data.voi_masks))]),
-                                        max(10 // iteration_interval1, 2))
+        idx = QualityMetrics.pass_index(m1, qm.thresholds(), max(10 // iteration_interval1, 2))
         iter = iters1[idx]
         pass_datadir = datadir1
         print('pass index (continuation run): ', iter)
@@ -31,6 +31,6 @@ if dataset is None:
     exit(1)
 
 datadir = Path(the_data_path(dataset))
-data = get_data(datadir, outdir=None, read_sinos=False)
+data = get_data(datadir, outdir=None, read_sinos=False, lazy=True)
 penalisation_factor = data.prior.get_penalisation_factor()
 print(penalisation_factor)
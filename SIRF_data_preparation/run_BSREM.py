@@ -19,6 +19,15 @@ Options:
   --initial_step_size=<s>     start stepsize [default: .3]
   --relaxation_eta=<r>        relaxation factor per epoch [default: .01]
   --interval=<i>              interval to save [default: 80]
+  --storage=<s>               "interfile" (one file per saved image) or "chunked" (single file, cropped to the FOV)
+                              [default: interfile]
+  --compress=<level>          zlib compression level for "chunked" storage [default: 0]
+  --objective_tol=<t>         stop once the relative objective change (every interval) is below this
+  --image_tol=<t>             stop once the normalised image change (every interval) is below this
+  --gradient_tol=<t>          stop once the relative projected gradient norm (every interval) is below this
+                              (if multiple tolerances are given, all need to hold, see `petric.ConvergenceMonitor`)
+  --checkpoint_interval=<c>   interval to save the full algorithm state (0: never) [default: 0]
+                              (the run is resumed from any existing checkpoint in the output directory)
   --outreldir=<relpath>       optional relative path to override
                               (defaults to 'BSREM' or 'BSREM_cont' if initial_image is set)
 """
@@ -30,10 +39,11 @@ import matplotlib.pyplot as plt
 from docopt import docopt
 
 import sirf.STIR as STIR
-from petric import OUTDIR, SRCDIR, MetricsWithTimeout, get_data
+from petric import OUTDIR, SRCDIR, ConvergenceMonitor, MetricsWithTimeout, get_data
 from sirf.contrib.BSREM.BSREM import BSREM1
 from sirf.contrib.partitioner import partitioner
 from SIRF_data_preparation import data_QC
+from SIRF_data_preparation.checkpoint_utilities import Checkpoint, load_checkpoint
 from SIRF_data_preparation.dataset_settings import get_settings
 
 # %%
@@ -49,6 +59,12 @@ num_subsets = args['--num_subsets']
 initial_step_size = float(args['--initial_step_size'])
 relaxation_eta = float(args['--relaxation_eta'])
 interval = int(args['--interval'])
+storage = args['--storage']
+compress = int(args['--compress'])
+tolerances = {
+    name: float(args[f'--{name}']) if args[f'--{name}'] is not None else None
+    for name in ('objective_tol', 'image_tol', 'gradient_tol')}
+checkpoint_interval = int(args['--checkpoint_interval'])
 outreldir = args['--outreldir']
 
 outdir = OUTDIR / scanID
@@ -86,6 +102,9 @@ print("outdir:", outdir)
 print("initial_step_size:", initial_step_size)
 print("relaxation_eta:", relaxation_eta)
 print("interval:", interval)
+print("storage:", storage)
+print("tolerances:", tolerances)
+print("checkpoint_interval:", checkpoint_interval)
 
 data_sub, acq_models, obj_funs = partitioner.data_partition(data.acquired_data, data.additive_term, data.mult_factors,
                                                             num_subsets, mode="staggered",
@@ -98,9 +117,18 @@ for f in obj_funs: # add prior evenly to every objective function
 
 algo = BSREM1(data_sub, obj_funs, initial=initial_image, initial_step_size=initial_step_size,
               relaxation_eta=relaxation_eta, update_objective_interval=interval)
+resumed = load_checkpoint(algo, outdir)
+callbacks = [
+    MetricsWithTimeout(**settings.slices, interval=interval, outdir=outdir, seconds=3600 * 100, append=resumed,
+                       storage=storage, crop=data.FOV_mask, compress=compress)]
+if any(tol is not None for tol in tolerances.values()):
+    callbacks.append(
+        ConvergenceMonitor(**tolerances, gradient=lambda x: sum(f.gradient(x) for f in obj_funs), interval=interval,
+                           logdir=callbacks[0].tb))
+if checkpoint_interval > 0:
+    callbacks.append(Checkpoint(outdir, interval=checkpoint_interval))
 # %%
-algo.run(num_updates,
-         callbacks=[MetricsWithTimeout(**settings.slices, interval=interval, outdir=outdir, seconds=3600 * 100)])
+algo.run(max(num_updates - algo.iteration, 0), callbacks=callbacks)
 # %%
 fig = plt.figure()
 data_QC.plot_image(algo.get_output(), **settings.slices, vmax=settings.vmax)
@@ -17,6 +17,10 @@ Options:
                               (defaults to 'LBFGSBPC' or 'LBFGSBPC_cont' if initial_image is set)
   --penalisation_factor_multiplier=<f>  factor to multiply the default penalisation factor with [default: 1]
                               (use with caution: You will likely want to specify outreldir)
+  --objective_tol=<t>         stop once the relative objective change (every interval) is below this
+  --image_tol=<t>             stop once the normalised image change (every interval) is below this
+  --gradient_tol=<t>          stop once the relative projected gradient norm (every interval) is below this
+                              (if multiple tolerances are given, all need to hold, see `petric.ConvergenceMonitor`)
 """
 # Copyright 2024 Rutherford Appleton Laboratory STFC
 # Copyright 2024-2025 University College London
@@ -31,7 +35,7 @@ from docopt import docopt
 from tqdm.auto import tqdm
 
 import sirf.STIR as STIR  # SIRF python interface to STIR # yapf: disable
-from petric import OUTDIR, SRCDIR, get_data
+from petric import OUTDIR, SRCDIR, ConvergenceMonitor, get_data
 from sirf.contrib.LBFGSBPC.LBFGSBPC import LBFGSBPC
 from sirf.contrib.partitioner import partitioner
 from SIRF_data_preparation import data_QC
@@ -119,6 +123,9 @@ interval = int(args['--interval'])
 outreldir = args['--outreldir']
 beta_factor = float(args['--penalisation_factor_multiplier'])
 FWHM = float(args['--initial_FWHM'])
+tolerances = {
+    name: float(args[f'--{name}']) if args[f'--{name}'] is not None else None
+    for name in ('objective_tol', 'image_tol', 'gradient_tol')}
 outdir = OUTDIR / scanID
 srcdir = SRCDIR / scanID
 # log.info("Finding files in %s", srcdir)
@@ -152,6 +159,7 @@ print("initial_image:", initial_image_name)
 print("FWHM of Gaussian filter:", FWHM)
 print("outdir:", outdir)
 print("interval:", interval)
+print("tolerances:", tolerances)
 
 num_subsets = 1
 initial = data.OSEM_image
@@ -167,8 +175,11 @@ algo = LBFGSBPC(obj_fun, initial=initial_image, update_objective_interval=interv
                 save_intermediate_results_path=str(outdir))
 algo.set_preconditioner(precond)
 # %%
+callbacks = []
+if any(tol is not None for tol in tolerances.values()):
+    callbacks.append(ConvergenceMonitor(**tolerances, gradient=obj_fun.gradient, interval=interval, logdir=outdir))
 with tqdm(desc="LBFGSBPC", total=num_updates) as t:
-    algo.run(iterations=num_updates, callbacks=[lambda alg: t.update(alg.iter - t.n)])
+    algo.run(iterations=num_updates, callbacks=[lambda alg: t.update(alg.iter - t.n)] + callbacks)
 # %%
 algo.get_output().write(str(outdir / "iter_final.hv"))
 # %%
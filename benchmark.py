@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Benchmark a `Submission` across datasets, recording time-to-threshold as scored by PETRIC
+(i.e. time, excluding metrics, until all `QualityMetrics.THRESHOLD`s hold for `threshold_window` iterations),
+per-iteration latency, peak memory and total wall time.
+
+Usage:
+  benchmark.py [options] [<dataset>...]
+
+Arguments:
+  <dataset>  dataset names (default: all in `SRCDIR`)
+
+Options:
+  --submission=<module>  module defining `Submission` & `submission_callbacks` (e.g. main_OSEM) [default: main]
+  --seconds=<s>          timeout per dataset [default: 600]
+  --outdir=<path>        output directory for iterates & logs (default: <OUTDIR>/benchmark/<submission>)
+  --output=<json>        file to write results to [default: benchmark.json]
+  --baseline=<json>      previous results to compare against (exit status 1 on regressions)
+  --tolerance=<t>        relative increase allowed before flagging a regression [default: 0.1]
+  --log=<level>          logging level [default: WARNING]
+"""
+# Copyright 2026 University College London
+# Licence: Apache-2.0
+import json
+import logging
+import platform
+import sys
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+from docopt import docopt
+
+from petric import DATA, OUTDIR, evaluate
+
+log = logging.getLogger('petric')
+COMPARED = ("time_to_threshold", "wall_time", "peak_rss", "latency.p50")
+"""(dotted) keys of results to check for regressions"""
+
+
+def run(src: str, submission: str = "main", seconds: float = 600, outdir=OUTDIR) -> dict:
+    """Benchmark `submission` on dataset `src`"""
+    start = perf_counter()
+    cbk = evaluate(src, submission=submission, outdir=outdir, seconds=seconds, profile=True, memory=True)
+    wall_time = perf_counter() - start
+    # NB: first "update" includes `Submission.__init__`
+    first, *latency = [wall for _, wall, _ in cbk.timings["update"]] or [None]
+    stats = {
+        "mean": np.mean(latency), "p50": np.percentile(latency, 50), "p90": np.percentile(latency, 90),
+        "p99": np.percentile(latency, 99), "max": np.max(latency)} if latency else {}
+    res = {
+        "iterations": len(cbk.timings["update"]), "first_update": first, "latency": stats,
+        "peak_rss": cbk.memory_log.peak_rss, "wall_time": wall_time, "time_to_threshold": None,
+        "iteration_to_threshold": None}
+    if (qm := cbk.quality_metrics) is not None and qm.threshold_iters >= qm.threshold_window:
+        res.update(time_to_threshold=qm.pass_time - cbk.start, iteration_to_threshold=qm.pass_iteration)
+    return res
+
+
+def _get(res: dict, key: str):
+    for k in key.split('.'):
+        if not isinstance(res, dict) or k not in res:
+            return None
+        res = res[k]
+    return res
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict], keys=COMPARED, tolerance: float = .1) -> list[str]:
+    """
+    Regressions of `results` w.r.t. `baseline` (both `{name: result}`), i.e. (dotted) `keys` which increased
+    by more than `tolerance` (relative), or which are missing (e.g. threshold not reached) but were present.
+    """
+    regressions = []
+    for name, base in baseline.items():
+        if name not in results:
+            continue
+        for key in keys:
+            if (old := _get(base, key)) is None:
+                continue
+            if (new := _get(results[name], key)) is None or new > old * (1+tolerance):
+                regressions.append(f"{name}: {key} {old:.4g} -> {'N/A' if new is None else f'{new:.4g}'}")
+    return regressions
+
+
+def main(argv=None):
+    args = docopt(__doc__, argv=argv)
+    logging.basicConfig(level=getattr(logging, args["--log"].upper()))
+    submission = args["--submission"]
+    outdir = Path(args["--outdir"] or OUTDIR / "benchmark" / submission)
+    results = {}
+    for src in args["<dataset>"] or DATA.keys():
+        results[src] = run(src, submission=submission, seconds=float(args["--seconds"]), outdir=outdir)
+        log.info("%s: %s", src, results[src])
+    Path(args["--output"]).write_text(
+        json.dumps({"submission": submission, "host": platform.node(), "datasets": results}, indent=2))
+    if args["--baseline"]:
+        baseline = json.loads(Path(args["--baseline"]).read_text())["datasets"]
+        if regressions := compare(results, baseline, tolerance=float(args["--tolerance"])):
+            print("Regressions:", *regressions, sep="\n  ")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""
+Benchmark the core operators used by submissions per dataset (and number of subsets):
+projection (`AcquisitionModelUsingParallelproj.forward/backward`), `get_subset`, the RDP gradient,
+and `ImageData`/`AcquisitionData` algebra. Times are the fastest of `--repeats` (in seconds).
+
+Usage:
+  benchmark_operators.py [options] [<dataset>...]
+
+Arguments:
+  <dataset>  dataset names (default: all in `SRCDIR`)
+
+Options:
+  --subsets=<n>      comma-separated numbers of subsets (default: 1 and the dataset's `num_subsets`)
+  --repeats=<r>      number of repetitions of each operation [default: 3]
+  --output=<json>    file to write results to [default: benchmark_operators.json]
+  --baseline=<json>  previous results to compare against (exit status 1 on regressions)
+  --tolerance=<t>    relative increase allowed before flagging a regression [default: 0.1]
+  --log=<level>      logging level [default: WARNING]
+"""
+# Copyright 2026 University College London
+# Licence: Apache-2.0
+import json
+import logging
+import platform
+import sys
+from functools import partial
+from pathlib import Path
+from time import perf_counter
+from typing import Callable
+
+from docopt import docopt
+
+import sirf.STIR as STIR
+from benchmark import compare
+from petric import DATA, SRCDIR, get_data
+from sirf.contrib.partitioner.partitioner import partition_indices
+from SIRF_data_preparation.dataset_settings import get_settings
+
+log = logging.getLogger('petric')
+
+
+def timeit(fn: Callable, repeats: int = 3) -> float:
+    """Fastest wall time (in seconds) of `repeats` calls of `fn()`"""
+    best = float('inf')
+    for _ in range(repeats):
+        start = perf_counter()
+        fn()
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def run(src: str, num_subsets: list[int] | None = None, repeats: int = 3) -> dict:
+    """Benchmark operators on dataset `src` for each of `num_subsets`"""
+    data = get_data(srcdir=SRCDIR / src, outdir=None)
+    if num_subsets is None:
+        num_subsets = sorted({1, get_settings(src).num_subsets})
+    x, y = data.OSEM_image, data.acquired_data
+    x_out, y_out = x.clone(), y.clone()
+    image_ops = {
+        "add": lambda: x.add(data.kappa, out=x_out), "multiply": lambda: x.multiply(data.kappa, out=x_out),
+        "divide": lambda: x.divide(data.kappa, out=x_out), "dot": lambda: x.dot(data.kappa)}
+    acquisition_ops = {
+        "add": lambda: y.add(data.additive_term, out=y_out),
+        "multiply": lambda: y.multiply(data.mult_factors, out=y_out),
+        "divide": lambda: y.divide(data.mult_factors, out=y_out), "dot": lambda: y.dot(data.mult_factors)}
+    res = {"prior_gradient": timeit(lambda: data.prior.gradient(x), repeats)}
+    res["image"] = {op: timeit(fn, repeats) for op, fn in image_ops.items()}
+    res["acquisition"] = {op: timeit(fn, repeats) for op, fn in acquisition_ops.items()}
+    res["subsets"] = {}
+    views = data.mult_factors.dimensions()[2]
+    for n in num_subsets:
+        indices = partition_indices(n, list(range(views)), stagger=True)[0]
+        subset = {"get_subset": timeit(partial(y.get_subset, indices), repeats)}
+        # as in `main_OSEM`
+        acq_model = STIR.AcquisitionModelUsingParallelproj()
+        acq_model.set_additive_term(data.additive_term.get_subset(indices))
+        acq_model.set_up(prompts := y.get_subset(indices), x)
+        fwd, bwd = acq_model.forward(x), acq_model.backward(prompts)
+        subset["set_up"] = timeit(partial(acq_model.set_up, prompts, x), repeats)
+        subset["forward"] = timeit(partial(acq_model.forward, x, out=fwd), repeats)
+        subset["backward"] = timeit(partial(acq_model.backward, prompts, out=bwd), repeats)
+        res["subsets"][str(n)] = subset
+        log.info("%s: %d subsets: %s", src, n, subset)
+    return res
+
+
+def _dotted_keys(res: dict, prefix: str = "") -> list[str]:
+    """(Dotted) keys of all leaves of (nested) `res`"""
+    keys = []
+    for key, value in res.items():
+        if isinstance(value, dict):
+            keys.extend(_dotted_keys(value, f"{prefix}{key}."))
+        else:
+            keys.append(f"{prefix}{key}")
+    return keys
+
+
+def main(argv=None):
+    args = docopt(__doc__, argv=argv)
+    logging.basicConfig(level=getattr(logging, args["--log"].upper()))
+    num_subsets = list(map(int, args["--subsets"].split(","))) if args["--subsets"] else None
+    results = {}
+    for src in args["<dataset>"] or DATA.keys():
+        results[src] = run(src, num_subsets=num_subsets, repeats=int(args["--repeats"]))
+    Path(args["--output"]).write_text(json.dumps({"host": platform.node(), "datasets": results}, indent=2))
+    if args["--baseline"]:
+        baseline = json.loads(Path(args["--baseline"]).read_text())["datasets"]
+        keys = sorted({key for res in baseline.values() for key in _dotted_keys(res)})
+        if regressions := compare(results, baseline, keys=keys, tolerance=float(args["--tolerance"])):
+            print("Regressions:", *regressions, sep="\n  ")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
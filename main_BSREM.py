@@ -9,7 +9,7 @@ Once renamed or symlinked as `main.py`, it will be used by `petric.py` as follow
 """
 from cil.optimisation.algorithms import Algorithm
 from cil.optimisation.utilities import callbacks
-from petric import Dataset
+from petric import Dataset, plan_subsets
 from sirf.contrib.BSREM.BSREM import BSREM1
 from sirf.contrib.partitioner import partitioner
 
@@ -32,12 +32,14 @@ class MaxIteration(callbacks.Callback):
 
 class Submission(BSREM1):
     # note that `issubclass(BSREM1, Algorithm) == True`
-    def __init__(self, data: Dataset, num_subsets: int = 7, update_objective_interval: int = 10):
+    def __init__(self, data: Dataset, num_subsets: int | None = None, update_objective_interval: int = 10):
         """
         Initialisation function, setting up data & (hyper)parameters.
-        NB: in practice, `num_subsets` should likely be determined from the data.
+        num_subsets: if `None`, from `petric.plan_subsets` (if calibrated, otherwise the dataset settings).
         This is just an example. Try to modify and improve it!
         """
+        if num_subsets is None:
+            num_subsets = plan_subsets(data).num_subsets
         data_sub, acq_models, obj_funs = partitioner.data_partition(data.acquired_data, data.additive_term,
                                                                     data.mult_factors, num_subsets,
                                                                     initial_image=data.OSEM_image)
@@ -7,11 +7,14 @@ Once renamed or symlinked as `main.py`, it will be used by `petric.py` as follow
 >>> algorithm = Submission(data)
 >>> algorithm.run(np.inf, callbacks=metrics + submission_callbacks)
 """
+from functools import partial
+
+import numpy as np
+
 import sirf.STIR as STIR
 from cil.optimisation.algorithms import Algorithm
 from cil.optimisation.utilities import callbacks
-from petric import Dataset
-from sirf.contrib.partitioner.partitioner import partition_indices
+from petric import Dataset, SubsetCache, plan_subsets, subset_sensitivity
 
 
 class MaxIteration(callbacks.Callback):
@@ -37,63 +40,101 @@ class Submission(Algorithm):
     NB: OSEM does not use `data.prior` and thus does not converge to the MAP reference used in PETRIC.
     NB: this example does not use the `sirf.STIR` Poisson objective function.
     NB: see https://github.com/SyneRBI/SIRF-Contribs/tree/master/src/Python/sirf/contrib/BSREM
+    NB: subsets of the sinograms are created by a `SubsetCache` and kept (as long as they fit in `subset_budget`
+    bytes when using `petric.get_data(storage="file")`, otherwise always). The additive term is therefore added to
+    the forward projection in `update` (rather than by the acquisition models).
+    NB: all work buffers (a forward projection & quotient per subset size, one back-projection image) are allocated
+    in `__init__` and `update` uses `out=` arguments, such that it does not allocate any images or sinograms
+    (unless `subset_budget` is too small to keep all prompts & additive term subsets).
+    NB: the objective (Poisson log-likelihood) is estimated from the forward projections computed by `update`
+    (see `update_objective`), i.e. without extra projections.
     """
-    def __init__(self, data: Dataset, num_subsets: int = 7, update_objective_interval: int = 10, **kwargs):
+    def __init__(self, data: Dataset, num_subsets: int | None = None, update_objective_interval: int = 10,
+                 subset_budget: float | None = None, **kwargs):
         """
         Initialisation function, setting up data & (hyper)parameters.
-        NB: in practice, `num_subsets` should likely be determined from the data.
+        num_subsets: if `None`, from `petric.plan_subsets` (if calibrated, otherwise the dataset settings).
+        subset_budget: memory (in bytes) for sinogram subsets (`None`: no limit, see `petric.SubsetCache`).
         This is just an example. Try to modify and improve it!
         """
+        if num_subsets is None:
+            num_subsets = plan_subsets(data).num_subsets
+        # find views in each subset, created on demand
+        # (note that SIRF can currently only do subsets over views)
+        self.subsets = SubsetCache(data, num_subsets, budget=subset_budget, stagger=True)
         self.acquisition_models = []
-        self.prompts = []
-        self.sensitivities = []
+        self.inv_sensitivities = []
+        self.buffers = {}                                # subset dimensions: (forward projection, quotient)
+        self.log_likelihood_terms = [None] * num_subsets # `sum(prompts * log(forward projection))` per subset
         self.subset = 0
         self.x = data.OSEM_image.clone()
+        self.sensitivity = self.x.get_uniform_copy(0)    # of all subsets
 
-        # find views in each subset
-        # (note that SIRF can currently only do subsets over views)
-        views = data.mult_factors.dimensions()[2]
-        partitions_idxs = partition_indices(num_subsets, list(range(views)), stagger=True)
-
-        # for each subset: find data, create acq_model, and create subset_sensitivity (backproj of 1)
+        # for each subset: create acq_model, and create subset sensitivity (backproj of mult_factors)
         for i in range(num_subsets):
-            prompts_subset = data.acquired_data.get_subset(partitions_idxs[i])
-            additive_term_subset = data.additive_term.get_subset(partitions_idxs[i])
-            multiplicative_factors_subset = data.mult_factors.get_subset(partitions_idxs[i])
+            prompts_subset = self.subsets["acquired_data", i]
+            multiplicative_factors_subset = self.subsets["mult_factors", i]
+            # create (and keep, see `SubsetCache`) the additive term before `update`
+            self.subsets["additive_term", i]
 
             acquisition_model_subset = STIR.AcquisitionModelUsingParallelproj()
-            acquisition_model_subset.set_additive_term(additive_term_subset)
             acquisition_model_subset.set_up(prompts_subset, self.x)
 
-            subset_sensitivity = acquisition_model_subset.backward(multiplicative_factors_subset)
+            # NB: cached on disk if `PETRIC_CACHEDIR` is set
+            sensitivity = subset_sensitivity(data, f"OSEM_{num_subsets}s_{i}",
+                                             partial(acquisition_model_subset.backward, multiplicative_factors_subset))
             # add a small number to avoid NaN in division
-            subset_sensitivity += subset_sensitivity.max() * 1e-6
+            sensitivity += sensitivity.max() * 1e-6
 
             self.acquisition_models.append(acquisition_model_subset)
-            self.prompts.append(prompts_subset)
-            self.sensitivities.append(subset_sensitivity)
+            self.inv_sensitivities.append(sensitivity.power(-1))
+            if (dims := prompts_subset.dimensions()) not in self.buffers:
+                self.buffers[dims] = prompts_subset.get_uniform_copy(0), prompts_subset.get_uniform_copy(0)
+            self.sensitivity += sensitivity
+        self.backprojection = self.x.get_uniform_copy(0)
 
         super().__init__(update_objective_interval=update_objective_interval, **kwargs)
         self.configured = True # required by Algorithm
 
     def update(self):
-        # compute forward projection for the denomintor
+        acquisition_model = self.acquisition_models[self.subset]
+        prompts = self.subsets["acquired_data", self.subset]
+        denom, quotient = self.buffers[prompts.dimensions()]
+        # compute forward projection (including the additive term) for the denomintor
         # add a small number to avoid NaN in division, as OSEM lead to 0/0 or worse.
         # (Theoretically, MLEM cannot, but it might nevertheless due to numerical issues)
-        denom = self.acquisition_models[self.subset].forward(self.x) + .0001
+        acquisition_model.forward(self.x, out=denom)
+        denom.add(self.subsets["additive_term", self.subset], out=denom)
+        denom.add(.0001, out=denom)
         # divide measured data by estimate (ignoring mult_factors!)
-        quotient = self.prompts[self.subset] / denom
+        prompts.divide(denom, out=quotient)
 
         # update image with quotient of the backprojection (without mult_factors!) and the sensitivity
-        self.x *= self.acquisition_models[self.subset].backward(quotient) / self.sensitivities[self.subset]
-        self.subset = (self.subset + 1) % len(self.prompts)
+        acquisition_model.backward(quotient, out=self.backprojection)
+        self.backprojection.multiply(self.inv_sensitivities[self.subset], out=self.backprojection)
+        self.x.multiply(self.backprojection, out=self.x)
+
+        # log-likelihood term of this subset (reusing `quotient` as work space),
+        # only if `update_objective` is called within the next epoch (i.e. not when run by PETRIC)
+        interval = self.update_objective_interval
+        if interval > 0 and (self.iteration + len(self.subsets)) // interval > (self.iteration - 1) // interval:
+            denom.log(out=quotient)
+            self.log_likelihood_terms[self.subset] = prompts.dot(quotient)
+        self.subset = (self.subset + 1) % len(self.subsets)
 
     def update_objective(self):
         """
-        NB: The objective value is not required by OSEM nor by PETRIC, so this returns `0`.
-        NB: It should be `sum(prompts * log(acq_model.forward(self.x)) - self.x * sensitivity)` across all subsets.
+        Append an estimate of the Poisson log-likelihood (up to a constant) to `self.loss`:
+        `sum(prompts * log(acq_model.forward(x)))` across all subsets, minus `x.dot(sensitivity)`.
+        NB: The first term uses the most recent forward projection of each subset (of the image before that
+        subset's update), so this is a running estimate over the last epoch (`nan` before the first epoch).
+        Its terms are only computed by `update` during the epoch before each call (per `update_objective_interval`).
+        NB: The objective value is not required by OSEM nor by PETRIC.
         """
-        return 0
+        if any(term is None for term in self.log_likelihood_terms):
+            self.loss.append(np.nan)
+        else:
+            self.loss.append(sum(self.log_likelihood_terms) - self.x.dot(self.sensitivity))
 
 
 submission_callbacks = [MaxIteration(660)]
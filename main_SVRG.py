@@ -0,0 +1,182 @@
+"""Main file to modify for submissions.
+
+Once renamed or symlinked as `main.py`, it will be used by `petric.py` as follows:
+
+>>> from main import Submission, submission_callbacks
+>>> from petric import data, metrics
+>>> algorithm = Submission(data)
+>>> algorithm.run(np.inf, callbacks=metrics + submission_callbacks)
+"""
+import tempfile
+from typing import Callable
+
+import numpy as np
+
+from cil.optimisation.algorithms import ISTA, Algorithm
+from cil.optimisation.functions import ApproximateGradientSumFunction, IndicatorBox
+from cil.optimisation.utilities import ConstantStepSize, Preconditioner, Sampler, callbacks
+from petric import Dataset, plan_subsets
+from sirf.contrib.partitioner import partitioner
+
+assert issubclass(ISTA, Algorithm)
+
+
+class MaxIteration(callbacks.Callback):
+    """
+    The organisers try to `Submission(data).run(inf)` i.e. for infinite iterations (until timeout).
+    This callback forces stopping after `max_iteration` instead.
+    """
+    def __init__(self, max_iteration: int, verbose: int = 1):
+        super().__init__(verbose)
+        self.max_iteration = max_iteration
+
+    def __call__(self, algorithm: Algorithm):
+        if algorithm.iteration >= self.max_iteration:
+            raise StopIteration
+
+
+class MyPreconditioner(Preconditioner):
+    """
+    Example based on the row-sum of the Hessian of the log-likelihood. See: Tsai et al. Fast Quasi-Newton Algorithms
+    for Penalized Reconstruction in Emission Tomography and Further Improvements via Preconditioning,
+    IEEE TMI https://doi.org/10.1109/tmi.2017.2786865
+    """
+    def __init__(self, kappa):
+        # add an epsilon to avoid division by zero (probably should make epsilon dependent on kappa)
+        self.kappasq = kappa*kappa + 1e-6
+
+    def apply(self, algorithm, gradient, out=None):
+        return gradient.divide(self.kappasq, out=out)
+
+
+class VarianceReducedFunction(ApproximateGradientSumFunction):
+    """
+    Variance-reduced stochastic gradient of `sum(functions)`, i.e.
+    `n * (gradient_i(x) - table[i]) + full_gradient` for a sampled subset `i` of `n`.
+
+    method: "SVRG" (`table` & `full_gradient` only change at snapshots) or
+      "SAGA" (`table[i]` & `full_gradient` are updated with every subset gradient).
+    snapshot_interval: number of epochs between (full gradient) snapshots (`None`: only the first for SAGA),
+      or a callable `(updates: int) -> bool` of the number of subset gradients since the previous snapshot.
+    dtype: of the per-subset gradient `table` (NB: not `np.float16`, as gradients can exceed its range).
+    storage: "memory" (`table` in RAM) or "file" (`table` is a `np.memmap` of an anonymous file in `tabledir`).
+    """
+    METHODS = ("SVRG", "SAGA")
+    STORAGE = ("memory", "file")
+
+    def __init__(self, functions, sampler=None, method: str = "SVRG",
+                 snapshot_interval: float | Callable[[int], bool] | None = 2, dtype=np.float32, storage: str = "memory",
+                 tabledir=None):
+        if method not in self.METHODS:
+            raise ValueError(f"method must be one of {self.METHODS}, got {method!r}")
+        if storage not in self.STORAGE:
+            raise ValueError(f"storage must be one of {self.STORAGE}, got {storage!r}")
+        super().__init__(functions, sampler)
+        self.method = method
+        self.snapshot_interval = snapshot_interval
+        self.dtype = np.dtype(dtype)
+        self.storage = storage
+        self.tabledir = tabledir
+        self.table = None
+        self.full_gradient = None
+        self.snapshots = 0
+        # subset gradients since the last snapshot
+        self.updates = 0
+        self._gradient = self._stored = None # work buffers
+
+    def snapshot_due(self) -> bool:
+        if self.table is None:
+            return True
+        if callable(self.snapshot_interval):
+            return self.snapshot_interval(self.updates)
+        return self.snapshot_interval is not None and self.updates >= self.snapshot_interval * self.num_functions
+
+    def _allocate(self, x):
+        shape = (self.num_functions, *x.shape)
+        if self.storage == "file":
+            # anonymous file, removed when `self.table` is released
+            self.table = np.memmap(tempfile.TemporaryFile(dir=self.tabledir), dtype=self.dtype, mode="w+", shape=shape)
+        else:
+            self.table = np.empty(shape, dtype=self.dtype)
+        self.full_gradient = x.get_uniform_copy(0)
+        self._gradient, self._stored = x.get_uniform_copy(0), x.get_uniform_copy(0)
+
+    def snapshot(self, x, out=None):
+        """Store all subset gradients at `x` in `table` and return their sum (`full_gradient`)"""
+        if self.table is None:
+            self._allocate(x)
+        self.full_gradient.fill(0)
+        for i, function in enumerate(self.functions):
+            function.gradient(x, out=self._gradient)
+            self.table[i] = self._gradient.as_array()
+            self.full_gradient.add(self._gradient, out=self.full_gradient)
+        if isinstance(self.table, np.memmap):
+            self.table.flush()
+        self.snapshots += 1
+        self.updates = 0
+        if out is None:
+            return self.full_gradient.copy()
+        out.fill(self.full_gradient)
+        return out
+
+    def gradient(self, x, out=None):
+        if self.snapshot_due():
+            self._update_data_passes_indices(list(range(self.num_functions)))
+            return self.snapshot(x, out=out)
+        self.function_num = self.sampler.next()
+        self._update_data_passes_indices([self.function_num])
+        return self.approximate_gradient(x, self.function_num, out=out)
+
+    def approximate_gradient(self, x, function_num: int, out=None):
+        n = self.num_functions
+        self.functions[function_num].gradient(x, out=self._gradient)
+        self._stored.fill(self.table[function_num])
+        # n * (gradient_i(x) - table[i])
+        self._gradient.sapyb(n, self._stored, -n, out=self._stored)
+        if self.method == "SAGA":
+            self.table[function_num] = self._gradient.as_array()
+            # NB: `out` is computed before updating `full_gradient`
+            out = self._stored.add(self.full_gradient, out=out)
+            self.full_gradient.sapyb(1, self._stored, 1 / n, out=self.full_gradient)
+        else:
+            out = self._stored.add(self.full_gradient, out=out)
+        self.updates += 1
+        return out
+
+
+class Submission(ISTA):
+    """Variance-reduced (SVRG or SAGA) stochastic subset version of preconditioned ISTA"""
+
+    # note that `issubclass(ISTA, Algorithm) == True`
+    def __init__(self, data: Dataset, num_subsets: int | None = None, step_size: float = 0.1, method: str = "SVRG",
+                 snapshot_interval: float | None = 2, storage: str = "memory", update_objective_interval: int = 10):
+        """
+        Initialisation function, setting up data & (hyper)parameters.
+        num_subsets: if `None`, from `petric.plan_subsets` (if calibrated, otherwise the dataset settings).
+        method, snapshot_interval, storage: see `VarianceReducedFunction`.
+        This is just an example. Try to modify and improve it!
+        """
+        if num_subsets is None:
+            num_subsets = plan_subsets(data).num_subsets
+        data_sub, acq_models, obj_funs = partitioner.data_partition(data.acquired_data, data.additive_term,
+                                                                    data.mult_factors, num_subsets, mode='staggered',
+                                                                    initial_image=data.OSEM_image)
+        # WARNING: modifies prior strength with 1/num_subsets (as currently needed for ISTA implementations)
+        data.prior.set_penalisation_factor(data.prior.get_penalisation_factor() / len(obj_funs))
+        data.prior.set_up(data.OSEM_image)
+        for f in obj_funs: # add prior evenly to every objective function
+            f.set_prior(data.prior)
+
+        sampler = Sampler.random_without_replacement(len(obj_funs))
+        # negative to turn minimiser into maximiser
+        f = -VarianceReducedFunction(obj_funs, sampler=sampler, method=method, snapshot_interval=snapshot_interval,
+                                     storage=storage)
+        step_size_rule = ConstantStepSize(step_size) # ISTA default step_size is 0.99*2.0/F.L
+        g = IndicatorBox(lower=0, accelerated=False) # non-negativity constraint
+
+        preconditioner = MyPreconditioner(data.kappa)
+        super().__init__(initial=data.OSEM_image, f=f, g=g, step_size=step_size_rule, preconditioner=preconditioner,
+                         update_objective_interval=update_objective_interval)
+
+
+submission_callbacks = [MaxIteration(1000)]
@@ -4,7 +4,8 @@ ANY CHANGES TO THIS FILE ARE IGNORED BY THE ORGANISERS.
 Only the `main.py` file may be modified by participants.
 
 This file is not intended for participants to use, except for
-the `get_data` function (and possibly `QualityMetrics` class).
+the `get_data` function (and possibly `QualityMetrics` class),
+and the helpers used by the example submissions (`plan_subsets`, `SubsetCache` & `subset_sensitivity`).
 It is used by the organisers to run the submissions in a controlled way.
 It is included here purely in the interest of transparency.
 
@@ -12,21 +13,42 @@ Usage:
   petric.py [options]
 
 Options:
-  --log LEVEL  : Set logging level (DEBUG, [default: INFO], WARNING, ERROR, CRITICAL)
+  --log LEVEL      : Set logging level (DEBUG, [default: INFO], WARNING, ERROR, CRITICAL)
+  --writers N      : Number of background threads for saving iterates (0: synchronous) [default: 0]
+  --profile        : Record per-iteration timing of updates & metrics callbacks
+  --memlog         : Record per-iteration process memory (RSS) & its high-water mark
+  --tracemalloc N  : Also trace Python allocations, reporting the top N at peak RSS (implies --memlog) [default: 0]
+  --adaptive       : Evaluate QualityMetrics sparsely while far from thresholds (see `QualityMetrics.adaptive`)
+  --tune-omp       : Use the fastest number of OpenMP threads per dataset & host (see `tune_omp_threads`)
+  --plan-subsets   : Calibrate `plan_subsets` per dataset & host before (i.e. not timed) running (needs a CACHEDIR)
+  --storage S      : Storage of full sinograms ("memory" or "file", see `LazyDataset`) [default: memory]
+  --jobs N         : Number of datasets to evaluate concurrently (in separate processes) [default: 1]
+  --memory GB      : Memory budget for concurrent jobs (0: 80% of total RAM) [default: 0]
 """
 import csv
+import hashlib
+import json
 import logging
+import multiprocessing
 import os
+import platform
 import re
-from dataclasses import dataclass
+import tracemalloc as _tracemalloc
+import zlib
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from dataclasses import dataclass, fields
+from functools import cached_property, lru_cache
+from itertools import chain
 from pathlib import Path, PurePath
-from time import time
-from typing import Iterable
+from threading import BoundedSemaphore, Event, Lock, Thread
+from time import perf_counter, process_time, sleep, time
+from typing import Callable, Iterable
 
 import numpy as np
 import psutil
 from scipy.ndimage import binary_erosion
-from skimage.metrics import mean_squared_error as mse
 from tensorboardX import SummaryWriter
 from tqdm.auto import tqdm
 
@@ -34,6 +56,7 @@ import sirf.STIR as STIR
 from cil.optimisation.algorithms import Algorithm
 from cil.optimisation.utilities import callbacks as cil_callbacks
 from img_quality_cil_stir import ImageQualityCallback
+from sirf.contrib.partitioner.partitioner import partition_indices
 from SIRF_data_preparation.dataset_settings import get_settings
 
 log = logging.getLogger('petric')
@@ -44,6 +67,7 @@ OUTDIR = Path(os.getenv("PETRIC_OUTDIR", f"/logs/{TEAM}/{VERSION}" if TEAM and V
 SRCDIR = Path(os.getenv("PETRIC_SRCDIR", "/mnt/share/petric"))
 if not SRCDIR.is_dir():
     SRCDIR = _petric_path / 'data'
+CACHEDIR = Path(cachedir) if (cachedir := os.getenv("PETRIC_CACHEDIR")) else None
 STIR.set_max_omp_threads(8) # limits Vision600 RAM use
 
 
@@ -60,38 +84,276 @@ class Callback(cil_callbacks.Callback):
         return algo.iteration % min(self.interval,
                                     algo.update_objective_interval) != 0 and algo.iteration != algo.max_iteration
 
+    def snapshot(self, algo: Algorithm) -> np.ndarray:
+        """
+        `algo.x.as_array()`, but shared (read-only) between the callbacks of a `MetricsWithTimeout`
+        (set as `_snapshot_`, similar to `_time_`), falling back to a new copy otherwise.
+        """
+        if (snapshot := getattr(self, "_snapshot_", None)) is not None and snapshot[0] == algo.iteration:
+            return snapshot[1]
+        return algo.x.as_array()
+
+
+def bounding_box(mask: STIR.ImageData | np.ndarray) -> tuple[slice, ...]:
+    """Smallest box (as slices) containing all non-zero voxels of `mask`"""
+    nonzero = np.nonzero(mask if isinstance(mask, np.ndarray) else mask.as_array())
+    return tuple(slice(int(idx.min()), int(idx.max()) + 1) for idx in nonzero)
+
+
+class IterationStore:
+    """
+    Iterates stored as chunks appended to a single "{name}.bin", optionally cropped & zlib-compressed,
+    with metadata in "{name}.json" and an index (iteration, objective, offset & size of each chunk) in "{name}.csv".
+
+    mode: "r" (read), "w" (write, truncating) or "a" (append to an existing store, e.g. when resuming).
+    crop: mask (e.g. `FOV_mask`) or slices, storing only its `bounding_box` (writing only).
+    compress: zlib compression level (0: uncompressed, writing only).
+    `append` is thread-safe, such that chunks can be written by `SaveIters` writers.
+    `read` also works while writing (for chunks appended by this instance, or previously when appending).
+    """
+    MODES = ("r", "w", "a")
+
+    def __init__(self, outdir: PurePath, name: str = "iterations", mode: str = "r",
+                 crop: STIR.ImageData | np.ndarray | tuple[slice, ...] | None = None, compress: int = 0):
+        if mode not in self.MODES:
+            raise ValueError(f"mode must be one of {self.MODES}, got {mode!r}")
+        outdir = Path(outdir)
+        self.bin, self.json, self.index_csv = (outdir / f"{name}.{ext}" for ext in ("bin", "json", "csv"))
+        self.meta: dict | None = None
+        if mode != "w" and self.json.is_file():
+            self.meta = json.loads(self.json.read_text())
+        self.index: dict[int, tuple[float, int, int]] = {} # iteration: (objective, offset, nbytes)
+        if mode == "r" and self.meta is None:
+            raise FileNotFoundError(self.json)
+        if self.meta is not None:
+            with self.index_csv.open() as fd:
+                reader = csv.reader(fd)
+                next(reader)
+                for iteration, objective, offset, nbytes in reader:
+                    self.index[int(iteration)] = float(objective), int(offset), int(nbytes)
+        if mode == "r":
+            self._fd = os.open(self.bin, os.O_RDONLY)
+            return
+        outdir.mkdir(parents=True, exist_ok=True)
+        self.crop = crop if crop is None or isinstance(crop, tuple) else bounding_box(crop)
+        self.compress = compress
+        append = self.meta is not None
+        self._bin = self.bin.open("ab" if append else "wb")
+        self._fd = os.open(self.bin, os.O_RDONLY)
+        self._csv = self.index_csv.open("a" if append else "w", buffering=1)
+        self.csv = csv.writer(self._csv)
+        if not append:
+            self.csv.writerow(("iter", "objective", "offset", "nbytes"))
+        self._lock = Lock()
+
+    @property
+    def slices(self) -> tuple[slice, ...]:
+        return tuple(slice(start, stop) for start, stop in self.meta["bbox"])
+
+    @property
+    def iterations(self) -> list[int]:
+        return sorted(self.index)
+
+    def append(self, iteration: int, objective: float, image: STIR.ImageData | np.ndarray):
+        """Add `image` (of `iteration`) as a new chunk"""
+        arr = image if isinstance(image, np.ndarray) else image.as_array()
+        with self._lock:
+            if self.meta is None:
+                bbox = self.crop or tuple(slice(0, n) for n in arr.shape)
+                self.meta = {
+                    "shape": arr.shape, "dtype": arr.dtype.str, "bbox": [(s.start, s.stop) for s in bbox],
+                    "compress": self.compress}
+                self.json.write_text(json.dumps(self.meta))
+        data = np.ascontiguousarray(arr[self.slices], dtype=self.meta["dtype"]).tobytes()
+        if self.meta["compress"]:
+            data = zlib.compress(data, self.meta["compress"])
+        with self._lock:
+            offset = self._bin.tell()
+            self._bin.write(data)
+            self._bin.flush()
+            self.csv.writerow((iteration, objective, offset, len(data)))
+            self.index[iteration] = objective, offset, len(data)
+
+    def read(self, iteration: int, full: bool = True) -> np.ndarray:
+        """Image array of `iteration`, either `full` size (zero outside the stored box) or cropped"""
+        _, offset, nbytes = self.index[iteration]
+        data = os.pread(self._fd, nbytes, offset)
+        if self.meta["compress"]:
+            data = zlib.decompress(data)
+        slices = self.slices
+        arr = np.frombuffer(data, dtype=self.meta["dtype"]).reshape([s.stop - s.start for s in slices])
+        if not full:
+            return arr
+        res = np.zeros(self.meta["shape"], dtype=arr.dtype)
+        res[slices] = arr
+        return res
+
+    def close(self):
+        os.close(self._fd)
+        if hasattr(self, "_bin"):
+            self._bin.close()
+            self._csv.close()
+
 
 class SaveIters(Callback):
-    """Saves `algo.x` as "iter_{algo.iteration:04d}.hv" and `algo.loss` in `csv_file`"""
-    def __init__(self, outdir=OUTDIR, csv_file='objectives.csv', **kwargs):
+    """
+    Saves `algo.x` as "iter_{algo.iteration:04d}.hv" and `algo.loss` in `csv_file`
+
+    writers: number of background threads writing images (default 0: write synchronously).
+      Each saved iterate is then a snapshot (`algo.x.clone()`) handed to the writer pool.
+    queue_depth: maximum number of snapshots pending in the writer pool.
+    on_full: back-pressure policy when `queue_depth` snapshots are pending:
+      "block" (wait for a free slot), "sync" (write on the calling thread), or "drop" (skip this image).
+      Dropped iterations are not written to `csv_file` (see also `last_saved`).
+    append: append to an existing `csv_file` (e.g. when resuming) rather than overwriting it.
+    storage: "interfile" (one image per saved iteration) or "chunked" (a single `IterationStore`, `self.store`).
+      NB: "iter_final.hv" is always written as Interfile.
+    crop, compress: passed to `IterationStore` (for `storage="chunked"`)
+    """
+    ON_FULL = ("block", "sync", "drop")
+    STORAGE = ("interfile", "chunked")
+
+    def __init__(self, outdir=OUTDIR, csv_file='objectives.csv', writers: int = 0, queue_depth: int = 2,
+                 on_full: str = "block", append: bool = False, storage: str = "interfile", crop=None, compress: int = 0,
+                 **kwargs):
         super().__init__(**kwargs)
+        if on_full not in self.ON_FULL:
+            raise ValueError(f"on_full must be one of {self.ON_FULL}, got {on_full!r}")
+        if storage not in self.STORAGE:
+            raise ValueError(f"storage must be one of {self.STORAGE}, got {storage!r}")
         self.outdir = Path(outdir)
         self.outdir.mkdir(parents=True, exist_ok=True)
-        self.csv = csv.writer((self.outdir / csv_file).open("w", buffering=1))
-        self.csv.writerow(("iter", "objective"))
+        append = append and (self.outdir / csv_file).is_file()
+        self._csv = (self.outdir / csv_file).open("a" if append else "w", buffering=1)
+        self.csv = csv.writer(self._csv)
+        if not append:
+            self.csv.writerow(("iter", "objective"))
+        self.on_full = on_full
+        self.pool = ThreadPoolExecutor(writers, thread_name_prefix="SaveIters") if writers > 0 else None
+        self._slots = BoundedSemaphore(queue_depth)
+        self._pending: list[Future] = []
+        self.last_saved: int | None = None # iteration
+        self.store = None
+        if storage == "chunked":
+            self.store = IterationStore(self.outdir, mode="a" if append else "w", crop=crop, compress=compress)
 
     def __call__(self, algo: Algorithm):
         if not self.skip_iteration(algo):
             log.debug("saving iter %d...", algo.iteration)
-            algo.x.write(str(self.outdir / f'iter_{algo.iteration:04d}.hv'))
-            self.csv.writerow((algo.iteration, algo.get_last_loss()))
-            log.debug("...saved")
+            if self.store is None:
+                saved = self.write(algo.x, f'iter_{algo.iteration:04d}.hv')
+            else:
+                saved = self.store_iterate(algo)
+            if saved:
+                self.last_saved = algo.iteration
+                self.csv.writerow((algo.iteration, algo.get_last_loss()))
+                log.debug("...saved")
         if algo.iteration == algo.max_iteration:
-            algo.x.write(str(self.outdir / 'iter_final.hv'))
+            self.write(algo.x, 'iter_final.hv', block=True)
+            self.flush()
+
+    def _background(self, desc: str, block: bool = False) -> bool | None:
+        """Whether to write in the background (having acquired a slot), synchronously (`False`) or not at all"""
+        if self.pool is None:
+            return False
+        if self._slots.acquire(blocking=block or self.on_full == "block"):
+            return True
+        if self.on_full == "drop":
+            log.warning("SaveIters queue full: dropping %s", desc)
+            return None
+        return False # on_full == "sync"
+
+    def _submit(self, fn: Callable, *args):
+        future = self.pool.submit(fn, *args)
+        future.add_done_callback(self._done)
+        self._pending = [f for f in self._pending if not f.done()] + [future]
+
+    def write(self, image: STIR.ImageData, fname: str, block: bool = False) -> bool:
+        """Write `image` to `outdir / fname`, in the background if `writers > 0`. Returns `False` if dropped."""
+        if (background := self._background(fname, block)) is None:
+            return False
+        if background:
+            self._submit(image.clone().write, str(self.outdir / fname))
+        else:
+            image.write(str(self.outdir / fname))
+        return True
+
+    def store_iterate(self, algo: Algorithm) -> bool:
+        """Append `algo.x` to `store`, in the background if `writers > 0`. Returns `False` if dropped."""
+        if (background := self._background(f"iteration {algo.iteration}")) is None:
+            return False
+        # NB: `snapshot` is a (read-only) copy, so safe to write in the background
+        args = algo.iteration, algo.get_last_loss(), self.snapshot(algo)
+        if background:
+            self._submit(self.store.append, *args)
+        else:
+            self.store.append(*args)
+        return True
+
+    def read(self, iteration: int) -> np.ndarray | None:
+        """Image array of a saved `iteration` (after any pending writes), or `None` if not saved"""
+        self.flush()
+        if self.store is not None:
+            return self.store.read(iteration) if iteration in self.store.index else None
+        return read_interfile(fname) if (fname := self.outdir / f'iter_{iteration:04d}.hv').is_file() else None
+
+    def _done(self, future: Future):
+        self._slots.release()
+        if (exc := future.exception()) is not None:
+            log.error("SaveIters failed to write: %s", exc)
+
+    def flush(self):
+        """Wait for all pending background writes to finish"""
+        wait_futures(self._pending)
+        self._pending = []
+
+    def close(self):
+        """Wait for pending writes, stop the writer threads & close `csv_file` (and `store`)"""
+        self.flush()
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+        self._csv.close()
+        if self.store is not None:
+            self.store.close()
+            self.store = None
 
 
 class StatsLog(Callback):
-    """Log image slices & objective value"""
+    """
+    Log image slices & objective value
+
+    In DEBUG mode, also logs the normalised change `|x - x_prev| / |x|`, using preallocated buffers.
+    fov_mask: if given, only compute the normalised change inside this mask.
+    """
     def __init__(self, transverse_slice=None, coronal_slice=None, sagittal_slice=None, vmax=None, logdir=OUTDIR,
-                 **kwargs):
+                 fov_mask: STIR.ImageData | None = None, **kwargs):
         super().__init__(**kwargs)
         self.transverse_slice = transverse_slice
         self.coronal_slice = coronal_slice
         self.sagittal_slice = sagittal_slice
         self.vmax = vmax
+        self.fov_mask = fov_mask
         self.x_prev = None
+        self.x_diff = None
+        self.x_masked = None
         self.tb = logdir if isinstance(logdir, SummaryWriter) else SummaryWriter(logdir=str(logdir))
 
+    def normalised_change(self, x: STIR.ImageData) -> float | None:
+        """`|x - x_prev| / |x|` (within `fov_mask` if set) without allocating images (except on first call)"""
+        if self.fov_mask is not None:
+            if self.x_masked is None:
+                self.x_masked = x.clone()
+            x.multiply(self.fov_mask, out=self.x_masked)
+            x = self.x_masked
+        if self.x_prev is None:
+            self.x_prev, self.x_diff = x.clone(), x.clone()
+            return None
+        x.subtract(self.x_prev, out=self.x_diff)
+        res = self.x_diff.norm() / x.norm()
+        self.x_prev.fill(x)
+        return res
+
     def __call__(self, algo: Algorithm):
         if self.skip_iteration(algo):
             return
@@ -105,11 +367,9 @@ class StatsLog(Callback):
 
         if log.getEffectiveLevel() <= logging.DEBUG:
             self.tb.add_scalar("objective", algo.get_last_loss(), algo.iteration, t)
-            if self.x_prev is not None:
-                normalised_change = (algo.x - self.x_prev).norm() / algo.x.norm()
+            if (normalised_change := self.normalised_change(algo.x)) is not None:
                 self.tb.add_scalar("normalised_change", normalised_change, algo.iteration, t)
-            self.x_prev = algo.x.clone()
-        x_arr = algo.x.as_array()
+        x_arr = self.snapshot(algo)
         self.tb.add_image("transverse", np.clip(x_arr[None, self.transverse_slice] / self.vmax, 0, 1), algo.iteration,
                           t)
         self.tb.add_image("coronal", np.clip(x_arr[None, :, self.coronal_slice] / self.vmax, 0, 1), algo.iteration, t)
@@ -118,12 +378,89 @@ class StatsLog(Callback):
         log.debug("...logged")
 
 
+class MemoryLog(Callback):
+    """
+    Log resident memory (RSS) of this process & its running peak as "memory/*" TensorBoard scalars and in `csv_file`
+
+    tracemalloc: if > 0, also trace (Python) allocations and keep the `tracemalloc` top allocators (by line)
+      at the RSS high-water mark. NB: this excludes allocations in C++ (e.g. STIR) and slows down Python code.
+    """
+    def __init__(self, logdir=OUTDIR, csv_file='memory.csv', tracemalloc: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.tb = logdir if isinstance(logdir, SummaryWriter) else SummaryWriter(logdir=str(logdir))
+        self.csv = csv.writer((Path(self.tb.logdir) / csv_file).open("w", buffering=1))
+        self.csv.writerow(("iter", "rss", "peak_rss", "traced", "traced_peak"))
+        self.process = psutil.Process()
+        self.tracemalloc = tracemalloc
+        self.peak_rss = self.process.memory_info().rss
+        self.peak_iteration = -1
+        self.top_allocators: list[str] = []
+        self._started_tracing = tracemalloc > 0 and not _tracemalloc.is_tracing()
+        if self._started_tracing:
+            _tracemalloc.start()
+
+    def __call__(self, algo: Algorithm):
+        if self.skip_iteration(algo):
+            return
+        t = self._time_
+        rss = self.process.memory_info().rss
+        traced, traced_peak = _tracemalloc.get_traced_memory() if _tracemalloc.is_tracing() else (0, 0)
+        if rss > self.peak_rss:
+            self.peak_rss, self.peak_iteration = rss, algo.iteration
+            if self.tracemalloc > 0 and _tracemalloc.is_tracing():
+                stats = _tracemalloc.take_snapshot().statistics('lineno')[:self.tracemalloc]
+                self.top_allocators = [str(stat) for stat in stats]
+        self.tb.add_scalar("memory/rss", rss, algo.iteration, t)
+        self.tb.add_scalar("memory/peak_rss", self.peak_rss, algo.iteration, t)
+        if traced_peak:
+            self.tb.add_scalar("memory/traced", traced, algo.iteration, t)
+            self.tb.add_scalar("memory/traced_peak", traced_peak, algo.iteration, t)
+        self.csv.writerow((algo.iteration, rss, self.peak_rss, traced, traced_peak))
+
+    def summary(self) -> str:
+        """High-water mark (in markdown), also added as TensorBoard text"""
+        lines = [f"peak RSS: {tqdm.format_sizeof(self.peak_rss, 'B', 1024)} (iteration {self.peak_iteration})"]
+        if _tracemalloc.is_tracing():
+            lines.append(f"peak traced: {tqdm.format_sizeof(_tracemalloc.get_traced_memory()[1], 'B', 1024)}")
+        if self.top_allocators:
+            lines.append("top allocators at peak RSS:")
+            lines.extend(f"- `{stat}`" for stat in self.top_allocators)
+        summary = "\n".join(lines)
+        self.tb.add_text("memory/summary", summary)
+        return summary
+
+    def close(self):
+        """Stop tracing (if started by this instance)"""
+        if self._started_tracing:
+            _tracemalloc.stop()
+            self._started_tracing = False
+
+
 class QualityMetrics(ImageQualityCallback, Callback):
-    """From https://github.com/SyneRBI/PETRIC2/wiki#metrics-and-thresholds"""
+    """
+    From https://github.com/SyneRBI/PETRIC2/wiki#metrics-and-thresholds
+
+    `pass_iteration` & `pass_time` record the start of the current run of `threshold_window` iterations
+    with all metrics within `THRESHOLD` (or `None`).
+
+    adaptive: evaluate sparsely while far from `THRESHOLD`. After each evaluation, the worst metric/threshold ratio
+      is extrapolated (log-linearly w.r.t. the previous evaluation) to predict the iterations needed to pass,
+      and the next `safety` fraction of these (between `interval` and `max_interval`) are skipped.
+      At most `threshold_window` intervals are skipped, so any passing run of `threshold_window` iterations
+      contains an evaluated one. Once all metrics are within `THRESHOLD`, every `interval` is evaluated.
+      If the threshold was crossed during skipped iterations, these are evaluated retrospectively (see `backfill`),
+      such that `pass_iteration` & `pass_time` are as without `adaptive`. NB: the algorithm may however stop
+      (up to `threshold_window` intervals) later, as the passing run is only detected at its evaluated iteration.
+    saved: `(iteration) -> (time, image array)` of a saved iteration (or `None`), e.g. `MetricsWithTimeout.saved`.
+      Required if `adaptive`. `pass_exact` is `False` if any needed iteration was not saved.
+    """
     THRESHOLD = {"AEM_VOI": 0.005, "RMSE_whole_object": 0.01, "RMSE_background": 0.01}
 
     def __init__(self, reference_image, whole_object_mask, background_mask, interval: int = 1,
-                 threshold_window: int = 10, **kwargs):
+                 threshold_window: int = 10, adaptive: bool = False, max_interval: int = 64, safety: float = 0.5,
+                 saved: Callable[[int], tuple[float, np.ndarray] | None] | None = None, **kwargs):
+        if adaptive and saved is None:
+            raise ValueError("adaptive requires saved iterations")
         # TODO: drop multiple inheritance once `interval` included in CIL
         Callback.__init__(self, interval=interval)
         ImageQualityCallback.__init__(self, reference_image, **kwargs)
@@ -133,39 +470,136 @@ class QualityMetrics(ImageQualityCallback, Callback):
         self.norm = self.ref_im_arr[self.background_indices].mean()
         self.threshold_window = threshold_window
         self.threshold_iters = 0
+        self.pass_iteration: int | None = None
+        self.pass_time: float | None = None
+        self.pass_exact = True
+        self.adaptive = adaptive
+        self.max_interval = max_interval
+        self.safety = safety
+        self.saved = saved
+        self.next_iteration = 0
+        self.last_iteration: int | None = None # last evaluated
+        self._last_ratio: float | None = None
+        self._compile_masks()
+
+    def _compile_masks(self):
+        """
+        Precompute flat voxel indices & integer labels of all masks (in `keys()` order),
+        such that `evaluate` needs a single gather and `np.bincount` per metric type.
+        Reference values are gathered once (in double precision).
+        """
+        shape = self.ref_im_arr.shape
+        masks = [self.whole_object_indices, self.background_indices]
+        masks += [self.voi_indices[name] for name in sorted(self.voi_indices)]
+        flat = []
+        for indices in masks:
+            mask = np.zeros(shape, dtype=bool)
+            mask[indices] = True
+            flat.append(np.flatnonzero(mask))
+        self._flat_indices = np.concatenate(flat)
+        self._labels = np.repeat(np.arange(len(flat)), [len(f) for f in flat])
+        self._counts = np.asarray([len(f) for f in flat], dtype=np.float64)
+        self._num_rmse = len(flat[0]) + len(flat[1]) # voxels used for RMSE (labels 0 & 1)
+        self._ref_values = self.ref_im_arr.ravel()[self._flat_indices].astype(np.float64)
+
+    def skip_iteration(self, algo: Algorithm) -> bool:
+        if Callback.skip_iteration(self, algo):
+            return True
+        return self.adaptive and algo.iteration < self.next_iteration and algo.iteration != algo.max_iteration
+
+    def next_interval(self, iteration: int, metrics: dict[str, float]) -> int:
+        """Iterations to skip (`adaptive` mode) after evaluating `metrics` at `iteration`"""
+        ratio = max(np.asarray(list(metrics.values())) / self.thresholds())
+        last = None if self.last_iteration is None else (self.last_iteration, self._last_ratio)
+        self._last_ratio = ratio
+        if ratio <= 1:
+            return self.interval
+        if last is None:
+            gap = self.interval
+        elif ratio < last[1]: # extrapolate to `ratio == 1`
+            gap = self.safety * np.log(ratio) * (iteration - last[0]) / np.log(last[1] / ratio)
+        else:
+            gap = 2 * (iteration - last[0])
+        max_interval = min(self.max_interval, self.threshold_window * self.interval)
+        return int(np.clip(gap // self.interval * self.interval, self.interval, max_interval))
 
     def __call__(self, algo: Algorithm):
         if self.skip_iteration(algo):
             return
         t = self._time_
         # log metrics
-        metrics = self.evaluate(algo.x)
+        metrics = self.evaluate(self.snapshot(algo))
+        if self.adaptive:
+            self.next_iteration = algo.iteration + self.next_interval(algo.iteration, metrics)
+        previous, self.last_iteration = self.last_iteration, algo.iteration
         for tag, value in metrics.items():
             self.tb_summary_writer.add_scalar(tag, value, algo.iteration, t)
         # stop if `all(metrics < THRESHOLD)` for `threshold_window` iters
-        # NB: need to strip suffix from "AEM_VOI" tags
-        if all(value <= self.THRESHOLD[re.sub("^(AEM_VOI)_.*", r"\1", tag)] for tag, value in metrics.items()):
+        if self.passed(metrics):
+            if self.threshold_iters == 0:
+                self.pass_iteration, self.pass_time = algo.iteration, t
+                if previous is not None and algo.iteration - previous > self.interval:
+                    self.backfill(previous, algo.iteration)
             self.threshold_iters += 1
             if self.threshold_iters >= self.threshold_window:
                 raise StopIteration
         else:
             self.threshold_iters = 0
+            self.pass_iteration = self.pass_time = None
 
-    def evaluate(self, test_im: STIR.ImageData) -> dict[str, float]:
-        assert not any(self.filter.values()), "Filtering not implemented"
-        test_im_arr = test_im.as_array()
-        whole = {
-            "RMSE_whole_object": np.sqrt(
-                mse(self.ref_im_arr[self.whole_object_indices], test_im_arr[self.whole_object_indices])) / self.norm,
-            "RMSE_background": np.sqrt(
-                mse(self.ref_im_arr[self.background_indices], test_im_arr[self.background_indices])) / self.norm}
-        local = {
-            f"AEM_VOI_{voi_name}": np.abs(test_im_arr[voi_indices].mean() - self.ref_im_arr[voi_indices].mean()) /
-            self.norm
-            for voi_name, voi_indices in sorted(self.voi_indices.items())}
-        self._evaluate_cache = {**whole, **local}
+    def passed(self, metrics: dict[str, float]) -> bool:
+        """Whether all `metrics` are within `THRESHOLD`"""
+        # NB: need to strip suffix from "AEM_VOI" tags
+        return all(value <= self.THRESHOLD[re.sub("^(AEM_VOI)_.*", r"\1", tag)] for tag, value in metrics.items())
+
+    def backfill(self, previous: int, iteration: int):
+        """
+        Evaluate the `saved` iterations skipped between `previous` (failing) & `iteration` (passing) backwards,
+        moving `pass_iteration` & `pass_time` to the first of the passing run (and counting it in `threshold_iters`).
+        """
+        for skipped in range(iteration - self.interval, previous, -self.interval):
+            if (saved := self.saved(skipped)) is None:
+                log.warning("QualityMetrics: iteration %d not saved, pass_iteration may be late", skipped)
+                self.pass_exact = False
+                return
+            t, arr = saved
+            # NB: not `evaluate()` to keep `_evaluate_cache` for the current iteration
+            metrics = dict(zip(self.keys(), self.evaluate_batch(arr[None])[0].tolist()))
+            for tag, value in metrics.items():
+                self.tb_summary_writer.add_scalar(tag, value, skipped, t)
+            if not self.passed(metrics):
+                return
+            self.pass_iteration, self.pass_time = skipped, t
+            self.threshold_iters += 1
+
+    def evaluate(self, test_im: STIR.ImageData | np.ndarray) -> dict[str, float]:
+        test_im_arr = test_im if isinstance(test_im, np.ndarray) else test_im.as_array()
+        self._evaluate_cache = dict(zip(self.keys(), self.evaluate_batch(test_im_arr[None])[0].tolist()))
         return self._evaluate_cache
 
+    def evaluate_batch(self, test_im_arrs: np.ndarray) -> np.ndarray:
+        """Metrics (in `keys()` order) of a stack of images (shape `(N, *image_shape)`) as `(N, len(keys()))` array"""
+        assert not any(self.filter.values()), "Filtering not implemented"
+        test_im_arrs = np.asanyarray(test_im_arrs)
+        diff = test_im_arrs.reshape(len(test_im_arrs), -1)[:, self._flat_indices] - self._ref_values
+        n, num_rmse = len(self._counts), self._num_rmse
+        # RMSE: sqrt(mean(diff^2)), AEM: |mean(test) - mean(ref)| = |mean(diff)|
+        sq = self._bincount(self._labels[:num_rmse], np.square(diff[:, :num_rmse]), 2)
+        lin = self._bincount(self._labels[num_rmse:] - 2, diff[:, num_rmse:], n - 2)
+        return np.concatenate((np.sqrt(sq / self._counts[:2]), np.abs(lin / self._counts[2:])), axis=1) / self.norm
+
+    @staticmethod
+    def _bincount(labels: np.ndarray, weights: np.ndarray, num_labels: int) -> np.ndarray:
+        """Row-wise `np.bincount(labels, weights=weights[i], minlength=num_labels)` for 2D `weights`"""
+        rows = len(weights)
+        if rows > 1:
+            labels = (labels + num_labels * np.arange(rows)[:, None]).ravel()
+        return np.bincount(labels, weights=weights.ravel(), minlength=num_labels * rows).reshape(rows, num_labels)
+
+    def thresholds(self) -> np.ndarray:
+        """`THRESHOLD` values in `keys()` order (e.g. for `pass_index`)"""
+        return np.asarray([self.THRESHOLD[re.sub("^(AEM_VOI)_.*", r"\1", tag)] for tag in self.keys()])
+
     def keys(self):
         return ["RMSE_whole_object", "RMSE_background"] + [f"AEM_VOI_{name}" for name in sorted(self.voi_indices)]
 
@@ -185,40 +619,280 @@ class QualityMetrics(ImageQualityCallback, Callback):
         return np.where(res)[0][0]
 
 
+class RunLog:
+    """
+    Append-only binary log of fixed-size records (one per iteration) in "{name}.bin",
+    with the (structured) dtype in "{name}.json", such that it can be read with `read_run_log` as a `np.memmap`.
+
+    columns: names of float64 fields (after "iter", "timestamp" & "time")
+    append: append to an existing log with the same columns (e.g. when resuming) rather than overwriting it.
+    """
+    def __init__(self, outdir: PurePath, columns: Iterable[str], name: str = "runlog", append: bool = False):
+        outdir = Path(outdir)
+        fields = [("iter", "<i8"), ("timestamp", "<f8"), ("time", "<f8")] + [(column, "<f8") for column in columns]
+        self.dtype = np.dtype(fields)
+        meta = {"descr": self.dtype.descr}
+        sidecar = outdir / f"{name}.json"
+        append = append and sidecar.is_file() and json.loads(sidecar.read_text()) == json.loads(json.dumps(meta))
+        if not append:
+            sidecar.write_text(json.dumps(meta))
+        self.fd = (outdir / f"{name}.bin").open("ab" if append else "wb")
+        self.empty = np.array((-1,) + (np.nan,) * (len(self.dtype) - 1), dtype=self.dtype)
+
+    def write(self, iteration: int, time_excluding_metrics: float, **values: float):
+        """Append a record (with any missing `values` as NaN)"""
+        record = self.empty.copy()
+        record["iter"], record["timestamp"], record["time"] = iteration, time(), time_excluding_metrics
+        for column, value in values.items():
+            record[column] = value
+        self.fd.write(record.tobytes())
+        self.fd.flush()
+
+    def close(self):
+        self.fd.close()
+
+
+def read_run_log(outdir: PurePath, name: str = "runlog") -> np.ndarray:
+    """Memory-map the records of a `RunLog` as a structured array (ignoring any incomplete trailing record)"""
+    outdir = Path(outdir)
+    dtype = np.dtype([tuple(field) for field in json.loads((outdir / f"{name}.json").read_text())["descr"]])
+    fname = outdir / f"{name}.bin"
+    if (num := fname.stat().st_size // dtype.itemsize) == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(fname, dtype=dtype, mode="r", shape=(num,))
+
+
+class ConvergenceMonitor(Callback):
+    """
+    Stops the algorithm once all given tolerances hold for `window` consecutive checks (every `interval` iterations):
+
+    objective_tol: relative change of the objective (`algo.loss`) since its previous value
+    image_tol: normalised image change `|x - x_prev| / |x|` since the previous check
+    gradient_tol: norm of the projected gradient (w.r.t. `x >= 0`) relative to that at the first check,
+      using `gradient(x)` (of the objective that is maximised, as for SIRF objective functions)
+
+    Tolerances which are `None` are not checked (nor computed). Values are logged as "convergence/*"
+    TensorBoard scalars (if `logdir` is set) and kept in `history`. `converged` is set before stopping.
+    """
+    def __init__(self, objective_tol: float | None = None, image_tol: float | None = None,
+                 gradient_tol: float | None = None, gradient: Callable[[STIR.ImageData], STIR.ImageData] | None = None,
+                 window: int = 3, logdir=None, **kwargs):
+        super().__init__(**kwargs)
+        if gradient_tol is not None and gradient is None:
+            raise ValueError("gradient_tol requires gradient")
+        self.tolerances = {"objective": objective_tol, "image": image_tol, "gradient": gradient_tol}
+        self.gradient = gradient
+        self.window = window
+        self.tb = logdir if logdir is None or isinstance(logdir, SummaryWriter) else SummaryWriter(logdir=str(logdir))
+        self.history: list[dict[str, float]] = []
+        self.converged = False
+        self.passed = 0
+        self.x_prev = None
+        self.x_diff = None
+        self.gradient_norm0 = None
+
+    def certificate(self, algo: Algorithm) -> dict[str, float]:
+        """Current values of the convergence criteria (`nan` if not yet available)"""
+        res = {}
+        if self.tolerances["objective"] is not None:
+            loss = algo.loss
+            res["objective"] = abs(loss[-1] - loss[-2]) / abs(loss[-1]) if len(loss) > 1 else np.nan
+        if self.tolerances["image"] is not None:
+            if self.x_prev is None:
+                self.x_prev, self.x_diff = algo.x.clone(), algo.x.clone()
+                res["image"] = np.nan
+            else:
+                algo.x.subtract(self.x_prev, out=self.x_diff)
+                res["image"] = self.x_diff.norm() / algo.x.norm()
+                self.x_prev.fill(algo.x)
+        if self.tolerances["gradient"] is not None:
+            # projected gradient (ascent): max(x + g, 0) - x
+            projected = (algo.x + self.gradient(algo.x)).maximum(0)
+            projected -= algo.x
+            norm = projected.norm()
+            if self.gradient_norm0 is None:
+                self.gradient_norm0 = norm or 1
+            res["gradient"] = norm / self.gradient_norm0
+        return res
+
+    def __call__(self, algo: Algorithm):
+        if self.skip_iteration(algo):
+            return
+        certificate = self.certificate(algo)
+        self.history.append({"iter": algo.iteration, **certificate})
+        if self.tb is not None:
+            for name, value in certificate.items():
+                self.tb.add_scalar(f"convergence/{name}", value, algo.iteration)
+        # NB: `nan <= tol` is `False`
+        if all(value <= self.tolerances[name] for name, value in certificate.items()):
+            self.passed += 1
+        else:
+            self.passed = 0
+        log.debug("convergence at iter %d: %s (%d/%d)", algo.iteration, certificate, self.passed, self.window)
+        if certificate and self.passed >= self.window:
+            self.converged = True
+            log.info("Converged at iteration %d: %s", algo.iteration, certificate)
+            raise StopIteration
+
+
 class MetricsWithTimeout(Callback):
-    """Stops the algorithm after `seconds`"""
+    """
+    Stops the algorithm after `seconds`
+
+    writers, queue_depth, on_full, append, storage, crop, compress: passed to `SaveIters` (for asynchronous writing
+      of iterates, appending to existing objectives when resuming, or storing iterates in a single file)
+    profile: record wall & CPU time of each child callback and of everything in between calls
+      (i.e. `algo.update()` and any other callbacks, recorded as "update") per iteration.
+      These are logged as "timing/*" TensorBoard scalars and summarised by `timing_summary()`.
+    fov_mask: passed to `StatsLog` (restricting the DEBUG normalised change to the FOV)
+    memory: log process memory per iteration (see `MemoryLog`), summarised by `memory_summary()`.
+    tracemalloc: passed to `MemoryLog` (implies `memory`)
+    Children share a single read-only `as_array()` copy of `algo.x` per (non-skipped) iteration (see `snapshot`).
+    run_log: log objective, `QualityMetrics` & "update" timing (if `profile`) per iteration in a `RunLog`
+      (created on the first call, i.e. after all `callbacks` are added). See `read_run_log`.
+    """
     def __init__(self, seconds=600, outdir=OUTDIR, transverse_slice=None, coronal_slice=None, sagittal_slice=None,
-                 vmax=None, tqdm_class=tqdm, **kwargs):
+                 vmax=None, tqdm_class=tqdm, writers=0, queue_depth=2, on_full="block", append=False, profile=False,
+                 fov_mask=None, memory=False, tracemalloc=0, storage="interfile", crop=None, compress=0, run_log=True,
+                 **kwargs):
         super().__init__(**kwargs)
         self._seconds = seconds
+        self.outdir = Path(outdir)
+        self.append = append
+        self.run_log: RunLog | bool = run_log
+        self.profile = profile
+        # name: [(iter, wall, cpu)]
+        self.timings: dict[str, list[tuple[int, float, float]]] = defaultdict(list)
+        # iteration: time (excluding metrics) of non-skipped iterations
+        self.times: dict[int, float] = {}
         self.callbacks = [
             cil_callbacks.ProgressCallback(desc=f"{TEAM}/{VERSION}/{outdir.name}", tqdm_class=tqdm_class),
-            SaveIters(outdir=outdir, **kwargs),
+            (save_cbk := SaveIters(outdir=outdir, writers=writers, queue_depth=queue_depth, on_full=on_full,
+                                   append=append, storage=storage, crop=crop, compress=compress, **kwargs)),
             (tb_cbk := StatsLog(logdir=outdir, transverse_slice=transverse_slice, coronal_slice=coronal_slice,
-                                sagittal_slice=sagittal_slice, vmax=vmax, **kwargs))]
+                                sagittal_slice=sagittal_slice, vmax=vmax, fov_mask=fov_mask, **kwargs))]
         self.tb = tb_cbk.tb # convenient access to the underlying SummaryWriter
+        self.save_iters = save_cbk
+        self.memory_log = None
+        if memory or tracemalloc:
+            self.memory_log = MemoryLog(logdir=self.tb, tracemalloc=tracemalloc, **kwargs)
+            self.callbacks.append(self.memory_log)
+        self.process = psutil.Process()
         self.reset()
 
     def reset(self, **tqdm_kwargs):
         self.callbacks[0].tqdm_kwargs.update(tqdm_kwargs)
         self.offset = 0
-        self.limit = (now := time()) + self._seconds
+        self.start = now = time()
+        self.limit = now + self._seconds
         self.tb.add_scalar("reset", 0, -1, now) # for relative timing calculation
+        self.timings.clear()
+        self.times.clear()
+        self._clock = perf_counter(), process_time()
+
+    def saved(self, iteration: int) -> tuple[float, np.ndarray] | None:
+        """Time (excluding metrics) & image array of an iteration saved by `save_iters` (or `None`)"""
+        if (t := self.times.get(iteration)) is None or (arr := self.save_iters.read(iteration)) is None:
+            return None
+        return t, arr
+
+    @property
+    def quality_metrics(self) -> QualityMetrics | None:
+        """The (first) `QualityMetrics` in `callbacks` (if any)"""
+        return next((c for c in self.callbacks if isinstance(c, QualityMetrics)), None)
+
+    def _record(self, name: str, iteration: int, start: tuple[float, float]):
+        """Record wall & CPU time since `start` (from `perf_counter(), process_time()`)"""
+        wall, cpu = perf_counter() - start[0], process_time() - start[1]
+        self.timings[name].append((iteration, wall, cpu))
+        self.tb.add_scalar(f"timing/{name}/wall", wall, iteration)
+        self.tb.add_scalar(f"timing/{name}/cpu", cpu, iteration)
 
     def __call__(self, algo: Algorithm):
-        if (time_excluding_metrics := (now := time()) - self.offset) > self.limit:
+        # NB: before any logging, which is excluded from the algorithm's time
+        now = time()
+        if self.profile:
+            self._record("update", algo.iteration, self._clock)
+        if (time_excluding_metrics := now - self.offset) > self.limit:
             log.warning("Timeout reached. Stopping algorithm.")
             self.tb.add_scalar("reset", 0, algo.iteration, time_excluding_metrics)
             raise StopIteration
-        for c in self.callbacks:
-            c._time_ = time_excluding_metrics
-            c(algo)
-        if isinstance(self.callbacks[-1], QualityMetrics) and isinstance(self.callbacks[0],
-                                                                         cil_callbacks.ProgressCallback):
-            self.callbacks[0].pbar.set_postfix(
-                RMSE_whole_object=self.callbacks[-1]._evaluate_cache['RMSE_whole_object'],
-                RAM=tqdm.format_sizeof(psutil.virtual_memory().used, '', 1024), refresh=False)
+        if self.skip_iteration(algo):
+            snapshot = None
+        else:
+            (arr := algo.x.as_array()).flags.writeable = False
+            snapshot = algo.iteration, arr
+            self.times[algo.iteration] = time_excluding_metrics
+        try:
+            for c in self.callbacks:
+                c._time_ = time_excluding_metrics
+                c._snapshot_ = snapshot
+                if not self.profile:
+                    c(algo)
+                    continue
+                start = perf_counter(), process_time()
+                try:
+                    c(algo)
+                finally:
+                    self._record(type(c).__name__, algo.iteration, start)
+        finally:
+            for c in self.callbacks:
+                # release memory
+                c._snapshot_ = None
+            if self.run_log and snapshot is not None:
+                self.log_run(algo, time_excluding_metrics)
+        if (qm := self.quality_metrics) is not None and isinstance(self.callbacks[0], cil_callbacks.ProgressCallback):
+            rss = tqdm.format_sizeof(self.process.memory_info().rss, '', 1024)
+            self.callbacks[0].pbar.set_postfix(RMSE_whole_object=qm._evaluate_cache['RMSE_whole_object'], RSS=rss,
+                                               refresh=False)
         self.offset += time() - now
+        self._clock = perf_counter(), process_time()
+
+    def log_run(self, algo: Algorithm, time_excluding_metrics: float):
+        """Append the current objective, metrics & timing to `run_log`"""
+        qm = self.quality_metrics
+        if not isinstance(self.run_log, RunLog):
+            columns = ["objective", "saved"] + (qm.keys() if qm is not None else [])
+            columns += ["update_wall", "update_cpu"] if self.profile else []
+            self.run_log = RunLog(self.outdir, columns, append=self.append)
+        # NB: `saved` is 0 if `SaveIters` dropped the image (`on_full="drop"`)
+        values = {"objective": algo.get_last_loss(), "saved": float(self.save_iters.last_saved == algo.iteration)}
+        if qm is not None and qm.last_iteration == algo.iteration:
+            values.update(qm._evaluate_cache)
+        if self.profile and self.timings["update"]:
+            values["update_wall"], values["update_cpu"] = self.timings["update"][-1][1:]
+        self.run_log.write(algo.iteration, time_excluding_metrics, **values)
+
+    def timing_summary(self) -> str:
+        """Table (in markdown) of recorded `timings`, also added as TensorBoard text"""
+        rows = [
+            "| phase | calls | total wall [s] | mean wall [s] | max wall [s] | total CPU [s] |",
+            "|---|---|---|---|---|---|"]
+        for name, records in self.timings.items():
+            wall, cpu = np.asarray([r[1:] for r in records]).T
+            rows.append(f"| {name} | {len(records)} | {wall.sum():.3f} | {wall.mean():.4f} | {wall.max():.4f} |"
+                        f" {cpu.sum():.3f} |")
+        table = "\n".join(rows)
+        if self.timings:
+            self.tb.add_text("timing/summary", table)
+        return table
+
+    def memory_summary(self) -> str:
+        """High-water mark of `memory_log` (if any)"""
+        return "" if self.memory_log is None else self.memory_log.summary()
+
+    def flush(self):
+        """Wait for any pending background output (e.g. `SaveIters` writes)"""
+        for c in self.callbacks:
+            if hasattr(c, 'flush'):
+                c.flush()
+        self.tb.flush()
+
+    def close(self):
+        """Release resources of the callbacks (e.g. `SaveIters` writer threads). NB: `saved` is then unavailable."""
+        for c in self.callbacks:
+            if hasattr(c, 'close'):
+                c.close()
 
     @staticmethod
     def mean_absolute_error(y, x):
@@ -258,10 +932,419 @@ class Dataset:
     path: PurePath
 
 
-def get_data(srcdir=".", outdir=OUTDIR, sirf_verbosity=0, read_sinos=True):
+def read_interfile_header(fname: PurePath) -> dict[str, str]:
+    """Parse the "key := value" lines of an Interfile header (keys in lower case, without '!')"""
+    header = {}
+    for line in Path(fname).read_text(errors="replace").splitlines():
+        if ":=" in line:
+            key, value = line.split(":=", 1)
+            key = re.sub(r"\s*\[", " [", re.sub(r"\s+", " ", key.strip().lstrip("!").lower()))
+            header[key] = value.strip()
+    return header
+
+
+def _interfile_layout(fname: PurePath) -> tuple[Path, np.dtype, int, tuple[int, ...] | None]:
+    """Data file, dtype, offset & shape (see `memmap_interfile`) from an Interfile header"""
+    header = read_interfile_header(fname)
+    kind = {"float": "f", "signed integer": "i", "unsigned integer": "u"}[header.get("number format", "float").lower()]
+    order = ">" if header.get("imagedata byte order", "LITTLEENDIAN").upper() == "BIGENDIAN" else "<"
+    dtype = np.dtype(f"{order}{kind}{header.get('number of bytes per pixel', '4')}")
+    offset = int(header.get("data offset in bytes [1]", header.get("data offset in bytes", "0")))
+    sizes = [header[f"matrix size [{i}]"] for i in range(1, int(header.get("number of dimensions", "0")) + 1)]
+    shape = tuple(map(int, reversed(sizes))) if all(s.isdigit() for s in sizes) and sizes else None
+    return Path(fname).parent / header["name of data file"], dtype, offset, shape
+
+
+def memmap_interfile(fname: PurePath) -> np.memmap:
+    """
+    Read-only `np.memmap` of the raw data of an Interfile image or sinogram (`.hv` or `.hs` header).
+    The shape is `(..., matrix size [2], matrix size [1])` (i.e. as `as_array()` for images) if all matrix sizes are
+    scalars, and flat otherwise (e.g. for sinograms with per-segment axial sizes).
+    """
+    datafile, dtype, offset, shape = _interfile_layout(fname)
+    return np.memmap(datafile, dtype=dtype, mode="r", offset=offset, shape=shape)
+
+
+def read_interfile(fname: PurePath) -> np.ndarray:
+    """Read the raw data of an Interfile image or sinogram into memory (without SIRF), see `memmap_interfile`"""
+    datafile, dtype, offset, shape = _interfile_layout(fname)
+    if shape is None:
+        return np.fromfile(datafile, dtype=dtype, offset=offset)
+    return np.fromfile(datafile, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+
+
+def _geometry(image: STIR.ImageData) -> dict[str, np.ndarray]:
+    """Geometrical information of `image` (to check compatibility of cached images)"""
+    geom = image.get_geometrical_info()
+    return {
+        "size": np.asarray(geom.get_size()), "spacing": np.asarray(geom.get_spacing()),
+        "offset": np.asarray(geom.get_offset()), "direction": np.asarray(geom.get_direction_matrix())}
+
+
+class LazyDataset(Dataset):
+    """
+    `Dataset` whose fields are only loaded (or computed) on first access, see `get_data(lazy=True)`.
+    Use `memmap()` for read-only access to the raw sinogram values without loading them via SIRF.
+
+    cachedir: if set, images derived from the data that are expensive to compute (e.g. `subset_sensitivity`) can be
+      stored in (and subsequently loaded from) `.npz` files in a subfolder of `cachedir` (see `_cached`),
+      keyed by a hash of the names, sizes and mtimes of the source files.
+      Only images with the geometry of `OSEM_image` are cached (as they are restored using it as a template).
+      NB: the fields themselves are not cached, as reading them is about as fast as reading a cached copy.
+    storage: "memory" (sinograms are read into RAM) or "file" (sinograms are read from disk when used).
+      In both cases, new `AcquisitionData` (e.g. from `get_subset()`) are stored in memory. See also `SubsetCache`.
+    """
+    CACHED_PATTERNS = ("*.hv", "*.v", "*.hs", "*.s", "penalisation_factor.txt")
+    STORAGE = ("memory", "file")
+
+    def __init__(self, srcdir: PurePath, read_sinos: bool = True, cachedir: PurePath | None = None,
+                 storage: str = "memory"):
+        # NB: does not call `Dataset.__init__`
+        if storage not in self.STORAGE:
+            raise ValueError(f"storage must be one of {self.STORAGE}, got {storage!r}")
+        self._srcdir = Path(srcdir)
+        self._read_sinos = read_sinos
+        self._cachedir = cachedir
+        self._storage = storage
+        self.path = self._srcdir.resolve()
+
+    def memmap(self, name: str) -> np.memmap:
+        """Raw data of sinogram `name` ("prompts", "additive_term" or "mult_factors"), see `memmap_interfile`"""
+        return memmap_interfile(self._srcdir / f"{name}.hs")
+
+    @cached_property
+    def cache(self) -> Path | None:
+        """Folder with cached images for this dataset (or `None` if caching is disabled)"""
+        if self._cachedir is None:
+            return None
+        key = hashlib.sha1(str(self.path).encode())
+        for fname in sorted(
+                chain.from_iterable(
+                    chain(self._srcdir.glob(pattern), (self._srcdir / 'PETRIC').glob(pattern))
+                    for pattern in self.CACHED_PATTERNS)):
+            stat = fname.stat()
+            key.update(f"{fname.relative_to(self._srcdir)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        (cache := Path(self._cachedir) / key.hexdigest()).mkdir(parents=True, exist_ok=True)
+        return cache
+
+    def _cached(self, name: str, load: Callable[[], STIR.ImageData | None]) -> STIR.ImageData | None:
+        """Return image `name` from the `cache` if possible, otherwise `load()` it (and add it to the `cache`)"""
+        if self.cache is None:
+            return load()
+        geometry = _geometry(self.OSEM_image)
+        if (fname := self.cache / f"{name}.npz").is_file():
+            with np.load(fname) as cached:
+                if all(np.array_equal(cached[key], value) for key, value in geometry.items()):
+                    image = self.OSEM_image.allocate(0)
+                    image.fill(cached["image"])
+                    return image
+            log.warning("Ignoring cached %s with incompatible geometry", fname)
+        if (image := load()) is None:
+            return None
+        if any(not np.array_equal(value, geometry[key]) for key, value in _geometry(image).items()):
+            log.debug("Not caching %s: geometry differs from OSEM_image", name)
+            return image
+        np.savez(tmp := fname.with_suffix(f".{os.getpid()}.tmp.npz"), image=image.as_array(), **geometry)
+        os.replace(tmp, fname)
+        return image
+
+    def _sino(self, fname):
+        if not self._read_sinos:
+            return None
+        STIR.AcquisitionData.set_storage_scheme(self._storage)
+        try:
+            return STIR.AcquisitionData(str(self._srcdir / fname))
+        finally:
+            STIR.AcquisitionData.set_storage_scheme('memory') # needed for get_subsets()
+
+    def _image(self, fname):
+        if (source := self._srcdir / 'PETRIC' / fname).is_file():
+            return STIR.ImageData(str(source))
+        return None # explicit to suppress linter warnings
+
+    @cached_property
+    def acquired_data(self):
+        return self._sino('prompts.hs')
+
+    @cached_property
+    def additive_term(self):
+        return self._sino('additive_term.hs')
+
+    @cached_property
+    def mult_factors(self):
+        return self._sino('mult_factors.hs')
+
+    @cached_property
+    def OSEM_image(self):
+        return STIR.ImageData(str(self._srcdir / 'OSEM_image.hv'))
+
+    @cached_property
+    def prior(self):
+        if (penalty_strength_file := (self._srcdir / 'penalisation_factor.txt')).is_file():
+            penalty_strength = float(np.loadtxt(penalty_strength_file))
+        else:
+            penalty_strength = 1 / 700 # default choice
+        return construct_RDP(penalty_strength, self.OSEM_image, self.kappa)
+
+    @cached_property
+    def kappa(self):
+        return STIR.ImageData(str(self._srcdir / 'kappa.hv'))
+
+    @cached_property
+    def reference_image(self):
+        return self._image('reference_image.hv')
+
+    @cached_property
+    def whole_object_mask(self):
+        return self._image('VOI_whole_object.hv')
+
+    @cached_property
+    def background_mask(self):
+        return self._image('VOI_background.hv')
+
+    @cached_property
+    def voi_masks(self):
+        return {
+            voi.stem[4:]: self._image(voi.name)
+            for voi in (self._srcdir / 'PETRIC').glob("VOI_*.hv") if voi.stem[4:] not in ('background', 'whole_object')}
+
+    @cached_property
+    def FOV_mask(self):
+        # WARNING: we are currently using Parralelproj with default settings, which uses a cylindrical FOV.
+        # The current code gives identical results to thresholding the sensitivity image (for those settings)
+        return STIR.TruncateToCylinderProcessor().process(self.OSEM_image.allocate(1))
+
+
+class SubsetCache:
+    """
+    Subsets of the sinograms of `data` (e.g. a `LazyDataset` with `storage="file"`),
+    created on demand by `get_subset()` (with views partitioned as in `main_OSEM`).
+
+    Subsets of "acquired_data" & "additive_term" are kept (in order of first use) while they fit within `budget`
+    bytes, others are recreated on every use. Kept subsets are never evicted, as access is typically cyclic
+    (e.g. OSEM), for which a least recently used policy would not have any hits once not all subsets fit.
+    "mult_factors" subsets (typically only used for set-up) are not kept.
+    budget: `None` for no limit. Ignored (i.e. no limit) unless the sinograms of `data` are stored on file,
+      as there is then no memory to be saved by recreating subsets.
+
+    Usage: `cache["acquired_data", i]` (or "additive_term", "mult_factors")
+    """
+    NAMES = ("acquired_data", "additive_term", "mult_factors")
+    KEPT = ("acquired_data", "additive_term")
+
+    def __init__(self, data: Dataset, num_subsets: int, budget: float | None = 4 * 1024**3, stagger: bool = True):
+        self.data = data
+        views = data.mult_factors.dimensions()[2]
+        self.indices = partition_indices(num_subsets, list(range(views)), stagger=stagger)
+        self.budget = budget if isinstance(data, LazyDataset) and data._storage == "file" else None
+        self.nbytes = 0
+        self.hits = self.misses = 0
+        self._subsets: dict[tuple[str, int], STIR.AcquisitionData] = {}
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __getitem__(self, key: tuple[str, int]) -> STIR.AcquisitionData:
+        name, subset = key
+        if name not in self.NAMES:
+            raise KeyError(f"{name!r} not in {self.NAMES}")
+        with self._lock:
+            if (res := self._subsets.get(key)) is not None:
+                self.hits += 1
+                return res
+            self.misses += 1
+            res = getattr(self.data, name).get_subset(self.indices[subset])
+            size = self._size(res)
+            if name in self.KEPT and (self.budget is None or self.nbytes + size <= self.budget):
+                self._subsets[key] = res
+                self.nbytes += size
+            return res
+
+    @staticmethod
+    def _size(acq_data: STIR.AcquisitionData) -> int:
+        return int(np.prod(acq_data.dimensions())) * 4 # float32
+
+    def clear(self):
+        with self._lock:
+            self._subsets.clear()
+            self.nbytes = 0
+
+
+def _peak_rss(fn: Callable, poll: float = .01):
+    """Call `fn()`, returning its result & the peak resident memory (in bytes) of this process meanwhile"""
+    process, peak, done = psutil.Process(), [0], Event()
+
+    def sample():
+        while not done.is_set():
+            peak[0] = max(peak[0], process.memory_info().rss)
+            sleep(poll)
+
+    sampler = Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        res = fn()
+    finally:
+        done.set()
+        sampler.join()
+    return res, max(peak[0], process.memory_info().rss)
+
+
+def tune_omp_threads(data: Dataset, max_threads: int | None = None, num_subsets: int = 8, repeats: int = 2,
+                     tolerance: float = .05, memory_budget: float | None = None, cachedir=CACHEDIR) -> int:
+    """
+    Number of OpenMP threads giving the best projector throughput on `data` (on this host).
+
+    Benchmarks forward & back projection of one of `num_subsets` subsets (as in `main_OSEM`) for powers of 2
+    threads (and `max_threads`, default: number of cores), measuring the fastest of `repeats` and peak memory.
+    Returns the fewest threads within `tolerance` (relative) of the fastest whose peak memory fits in
+    `memory_budget` (default: currently available RAM). Cached in `cachedir / "omp_threads.json"` per host & dataset.
+    """
+    max_threads = max_threads or psutil.cpu_count() or 1
+    key = f"{platform.node()}/{Path(data.path).name}/{max_threads}"
+    cache = None if cachedir is None else Path(cachedir) / "omp_threads.json"
+    cached = json.loads(cache.read_text()) if cache is not None and cache.is_file() else {}
+    if key in cached:
+        return cached[key]["threads"]
+
+    views = data.mult_factors.dimensions()[2]
+    prompts = data.acquired_data.get_subset(list(range(0, views, num_subsets)))
+    acq_model = STIR.AcquisitionModelUsingParallelproj()
+    acq_model.set_up(prompts, data.OSEM_image)
+    baseline = psutil.Process().memory_info().rss
+    candidates = sorted({2**i for i in range(max_threads.bit_length()) if 2**i <= max_threads} | {max_threads})
+    # threads: (seconds, peak memory increase)
+    results = {}
+    for threads in candidates:
+        STIR.set_max_omp_threads(threads)
+        seconds, peak = np.inf, 0
+        for _ in range(repeats):
+            start = perf_counter()
+            _, rss = _peak_rss(lambda: acq_model.backward(acq_model.forward(data.OSEM_image)))
+            seconds, peak = min(seconds, perf_counter() - start), max(peak, rss - baseline)
+        results[threads] = seconds, peak
+        log.debug("OpenMP threads: %d: %.3gs, %s", threads, seconds, tqdm.format_sizeof(peak, 'B', 1024))
+    if memory_budget is None:
+        memory_budget = psutil.virtual_memory().available
+    fitting = {threads: res for threads, res in results.items() if res[1] <= memory_budget} or results
+    fastest = min(seconds for seconds, _ in fitting.values())
+    best = min(threads for threads, (seconds, _) in fitting.items() if seconds <= fastest * (1+tolerance))
+    log.info("OpenMP threads for %s: %d (of %s)", key, best, candidates)
+    if cache is not None:
+        cached[key] = {"threads": best, "benchmark": {str(threads): res for threads, res in results.items()}}
+        cache.parent.mkdir(parents=True, exist_ok=True)
+        (tmp := cache.with_suffix(f".{os.getpid()}.tmp")).write_text(json.dumps(cached, indent=1))
+        os.replace(tmp, cache)
+    return best
+
+
+@dataclass(frozen=True)
+class SubsetPlan:
+    """Number of subsets & partitioning `mode` (as used by `partitioner.data_partition`) chosen by `plan_subsets`"""
+    num_subsets: int
+    mode: str = "staggered"
+    overhead: float = 0   # seconds per update independent of the subset size (e.g. image operations)
+    projection: float = 0 # seconds for projecting all views (forward & back)
+
+
+def plan_subsets(data: Dataset, candidates: Iterable[int] | None = None, min_views: int = 8, min_counts: float = 1e7,
+                 repeats: int = 2, cachedir=CACHEDIR, calibrate: bool = False, default: int = 7) -> SubsetPlan:
+    """
+    Choose the number of subsets minimising the expected time-to-threshold on `data` (on this host).
+
+    The time per update is modelled as `overhead + projection / num_subsets`, calibrated by timing the prior gradient
+    and forward & back projection of a subset for 2 numbers of subsets (the largest candidate & about half of it).
+    Subsets are assumed to accelerate convergence (per epoch) by `num_subsets / (1 + num_subsets / saturation)`,
+    i.e. with diminishing returns for more than `saturation` subsets: `total counts / min_counts`, but at least
+    the `num_subsets` of the dataset settings. Hence the expected time is proportional to
+    `(num_subsets * overhead + projection) * (1 / num_subsets + 1 / saturation)`,
+    which is minimal for `num_subsets = sqrt(saturation * projection / overhead)`.
+    candidates: numbers of subsets to consider (default: all with at least `min_views` views per subset).
+    calibrate: whether to calibrate if there is no cached plan. This is slow, so should be done offline
+      (e.g. `petric.py --plan-subsets`) rather than in `Submission.__init__`.
+      Otherwise, the `num_subsets` of the dataset settings are used.
+    default: `num_subsets` of datasets not in the settings (e.g. participants' own data).
+    Cached in `cachedir / "subset_plans.json"` per host & dataset.
+    """
+    views = data.mult_factors.dimensions()[2]
+    candidates = sorted(candidates or range(1, max(views // min_views, 1) + 1))
+    key = f"{platform.node()}/{Path(data.path).name}/{','.join(map(str, candidates))}"
+    cache = None if cachedir is None else Path(cachedir) / "subset_plans.json"
+    cached = json.loads(cache.read_text()) if cache is not None and cache.is_file() else {}
+    if key in cached:
+        return SubsetPlan(**cached[key])
+    try:
+        num_subsets = get_settings(Path(data.path).name).num_subsets
+    except KeyError:
+        num_subsets = default
+    if not calibrate:
+        log.info("no subset plan for %s: using %d subsets", key, num_subsets)
+        return SubsetPlan(num_subsets)
+    if cache is None:
+        log.warning("plan_subsets: calibrating without cachedir, so the plan is not kept")
+
+    def update_time(num_subsets: int) -> float:
+        """Fastest of `repeats` subset projections & prior gradient"""
+        prompts = data.acquired_data.get_subset(partition_indices(num_subsets, list(range(views)), stagger=True)[0])
+        acq_model = STIR.AcquisitionModelUsingParallelproj()
+        acq_model.set_up(prompts, data.OSEM_image)
+        best = np.inf
+        for _ in range(repeats):
+            start = perf_counter()
+            acq_model.backward(acq_model.forward(data.OSEM_image))
+            data.prior.gradient(data.OSEM_image)
+            best = min(best, perf_counter() - start)
+        return best
+
+    # NB: avoid the (slow & memory hungry) smallest numbers of subsets
+    hi = candidates[-1]
+    lo = min(n for n in candidates if n >= hi // 2)
+    if lo == hi:
+        overhead, projection = 0, update_time(lo) * lo
+    else:
+        t_lo, t_hi = update_time(lo), update_time(hi)
+        projection = max((t_lo-t_hi) / (1/lo - 1/hi), 0)
+        overhead = max(t_hi - projection/hi, 0)
+    saturation = max(data.acquired_data.sum() / min_counts, num_subsets)
+    expected = {n: (n*overhead + projection) * (1/n + 1/saturation) for n in candidates}
+    plan = SubsetPlan(min(expected, key=expected.get), overhead=overhead, projection=projection)
+    log.info("subset plan for %s: %s", key, plan)
+    if cache is not None:
+        cached[key] = {field.name: getattr(plan, field.name) for field in fields(plan)}
+        cache.parent.mkdir(parents=True, exist_ok=True)
+        (tmp := cache.with_suffix(f".{os.getpid()}.tmp")).write_text(json.dumps(cached, indent=1))
+        os.replace(tmp, cache)
+    return plan
+
+
+@lru_cache
+def _sensitivity_cache(path: PurePath, cachedir: PurePath | None) -> LazyDataset:
+    """`LazyDataset` (without sinograms) used by `subset_sensitivity` for its `cache`, one per dataset"""
+    return LazyDataset(path, read_sinos=False, cachedir=cachedir)
+
+
+def subset_sensitivity(data: Dataset, name: str, compute: Callable[[], STIR.ImageData],
+                       cachedir=CACHEDIR) -> STIR.ImageData:
+    """
+    Sensitivity image `name` (e.g. "OSEM_7s_0" for subset 0 of 7 staggered subsets) of `data`,
+    loaded from the `LazyDataset.cache` in `cachedir` if present, otherwise `compute()`d (and added to the cache).
+    """
+    if isinstance(data, LazyDataset) and data._cachedir == cachedir:
+        return data._cached(f"sensitivity_{name}", compute)
+    return _sensitivity_cache(data.path, cachedir)._cached(f"sensitivity_{name}", compute)
+
+
+def get_data(srcdir=".", outdir=OUTDIR, sirf_verbosity=0, read_sinos=True, lazy=False, cachedir=CACHEDIR,
+             omp_threads: int | str | None = None, max_omp_threads: int | None = None, storage: str = "memory"):
     """
     Load data from `srcdir`, constructs prior and return as a `Dataset`.
     Also redirects sirf.STIR log output to `outdir`, unless that's set to None
+    lazy: return a `LazyDataset` instead, only loading its fields on first access.
+    cachedir: persistent cache of derived images & tuning (default: `PETRIC_CACHEDIR` environment variable),
+      see `LazyDataset`.
+    omp_threads: if set, the number of OpenMP threads to use, or "auto" for `tune_omp_threads` (up to
+      `max_omp_threads`, using `cachedir`).
+    storage: "file" to keep full sinograms on disk (see `LazyDataset`), e.g. with a `SubsetCache`.
     """
     srcdir = Path(srcdir)
     STIR.set_verbosity(sirf_verbosity)                # set to higher value to diagnose problems
@@ -270,35 +1353,135 @@ def get_data(srcdir=".", outdir=OUTDIR, sirf_verbosity=0, read_sinos=True):
     if outdir is not None:
         outdir = Path(outdir)
         _ = STIR.MessageRedirector(str(outdir / 'info.txt'), str(outdir / 'warnings.txt'), str(outdir / 'errors.txt'))
-    acquired_data = STIR.AcquisitionData(str(srcdir / 'prompts.hs')) if read_sinos else None
-    additive_term = STIR.AcquisitionData(str(srcdir / 'additive_term.hs')) if read_sinos else None
-    mult_factors = STIR.AcquisitionData(str(srcdir / 'mult_factors.hs')) if read_sinos else None
-    OSEM_image = STIR.ImageData(str(srcdir / 'OSEM_image.hv'))
-    # Find FOV mask
-    # WARNING: we are currently using Parralelproj with default settings, which uses a cylindrical FOV.
-    # The current code gives identical results to thresholding the sensitivity image (for those settings)
-    FOV_mask = STIR.TruncateToCylinderProcessor().process(OSEM_image.allocate(1))
-    kappa = STIR.ImageData(str(srcdir / 'kappa.hv'))
-    if (penalty_strength_file := (srcdir / 'penalisation_factor.txt')).is_file():
-        penalty_strength = float(np.loadtxt(penalty_strength_file))
-    else:
-        penalty_strength = 1 / 700 # default choice
-    prior = construct_RDP(penalty_strength, OSEM_image, kappa)
+    data = LazyDataset(srcdir, read_sinos=read_sinos, cachedir=cachedir, storage=storage)
+    if omp_threads == "auto":
+        omp_threads = tune_omp_threads(data, max_threads=max_omp_threads, cachedir=cachedir)
+    if omp_threads is not None:
+        STIR.set_max_omp_threads(int(omp_threads))
+    if lazy:
+        return data
+    return Dataset(**{field.name: getattr(data, field.name) for field in fields(Dataset)})
 
-    def get_image(fname):
-        if (source := srcdir / 'PETRIC' / fname).is_file():
-            return STIR.ImageData(str(source))
-        return None # explicit to suppress linter warnings
 
-    reference_image = get_image('reference_image.hv')
-    whole_object_mask = get_image('VOI_whole_object.hv')
-    background_mask = get_image('VOI_background.hv')
-    voi_masks = {
-        voi.stem[4:]: STIR.ImageData(str(voi))
-        for voi in (srcdir / 'PETRIC').glob("VOI_*.hv") if voi.stem[4:] not in ('background', 'whole_object')}
+def evaluate(src: str, submission: str = "main", outdir: PurePath = OUTDIR, seconds: float = 600,
+             callbacks: Iterable[Callback] = (), writers: int = 0, profile: bool = False, memory: bool = False,
+             tracemalloc: int = 0, adaptive: bool = False, omp_threads: int | None = None, tune_omp: bool = False,
+             storage: str = "memory", calibrate_subsets: bool = False, position: int = 0) -> MetricsWithTimeout:
+    """
+    Run `Submission` (from module `submission`) on dataset `src` with metrics & timeout (as done by the organisers)
+    Additional `callbacks` are run (excluded from timing) by the returned `MetricsWithTimeout`.
+    calibrate_subsets: run `plan_subsets(calibrate=True)` before (i.e. excluded from timing) the `Submission`.
+    """
+    from importlib import import_module
+    from traceback import print_exc
+
+    module = import_module(submission)
+    Submission, submission_callbacks = module.Submission, module.submission_callbacks
+    assert issubclass(Submission, Algorithm)
+    settings = get_settings(src)
+    out = settings.name
+    # NB: `MetricsWithTimeout` contains `SaveIters` which creates `outdir`
+    cbk = MetricsWithTimeout(seconds=seconds, outdir=outdir / out, **settings.slices, vmax=settings.vmax,
+                             writers=writers, profile=profile, memory=memory, tracemalloc=tracemalloc)
+    data = get_data(srcdir=SRCDIR / src, outdir=outdir / out, omp_threads="auto" if tune_omp else omp_threads,
+                    max_omp_threads=omp_threads, storage=storage)
+    if calibrate_subsets:
+        plan_subsets(data, calibrate=True)
+    if data.reference_image is not None:
+        cbk.callbacks.append(
+            QualityMetrics(data.reference_image, data.whole_object_mask, data.background_mask, tb_summary_writer=cbk.tb,
+                           voi_mask_dict=data.voi_masks, adaptive=adaptive, saved=cbk.saved))
+    cbk.callbacks.extend(callbacks)
+    cbk.reset(position=position) # timeout from now
+    algo = Submission(data, update_objective_interval=np.iinfo(np.int32).max)
+    try:
+        algo.run(np.inf, callbacks=submission_callbacks + [cbk])
+    except Exception:
+        print_exc(limit=2)
+    finally:
+        cbk.flush()
+        if cbk.profile:
+            log.info("%s timing:\n%s", src, cbk.timing_summary())
+        if cbk.memory_log is not None:
+            log.info("%s memory:\n%s", src, cbk.memory_summary())
+        cbk.close()
+        del algo
+    return cbk
+
+
+def _evaluate_job(src: str, log_level: int, **kwargs):
+    """`evaluate` in a child process (which needs its own logging set-up)"""
+    from tqdm.contrib.logging import logging_redirect_tqdm
+    logging.basicConfig(level=log_level)
+    with logging_redirect_tqdm():
+        evaluate(src, **kwargs)
+
+
+def estimate_memory(srcdir: PurePath) -> int:
+    """
+    Rough estimate (in bytes) of the peak memory needed to evaluate a submission on the dataset in `srcdir`:
+    the 3 full sinograms, as many again for subset copies (e.g. `partitioner.data_partition`) and
+    a sinogram of work space, plus ~20 images.
+    """
+    def data_size(header: Path) -> int:
+        if not header.is_file():
+            return 0
+        return (header.parent / read_interfile_header(header)["name of data file"]).stat().st_size
+
+    srcdir = Path(srcdir)
+    sinos = [data_size(srcdir / f"{name}.hs") for name in ("prompts", "additive_term", "mult_factors")]
+    return 2 * sum(sinos) + max(sinos) + 20 * data_size(srcdir / "OSEM_image.hv")
+
+
+def _rss(pid: int) -> int:
+    """Resident memory (in bytes) of process `pid` and its children"""
+    try:
+        proc = psutil.Process(pid)
+        return sum(p.memory_info().rss for p in [proc] + proc.children(recursive=True))
+    except psutil.NoSuchProcess:
+        return 0
 
-    return Dataset(acquired_data, additive_term, mult_factors, OSEM_image, prior, kappa, reference_image,
-                   whole_object_mask, background_mask, voi_masks, FOV_mask, srcdir.resolve())
+
+def schedule(srcs: Iterable[str], jobs: int, memory_budget: float | None = None, poll: float = 1,
+             log_level=logging.INFO, **kwargs):
+    """
+    `evaluate` each dataset in `srcs` in a separate process, running at most `jobs` concurrently.
+    A job is only started if its memory (`estimate_memory`, or the measured RSS of running jobs if larger)
+    fits into `memory_budget` (bytes, default: 80% of total RAM) as well as the currently available RAM.
+    The OpenMP threads are shared equally between jobs.
+    """
+    memory_budget = memory_budget or .8 * psutil.virtual_memory().total
+    omp_threads = max(1, (psutil.cpu_count() or 1) // jobs)
+    # avoid forking OpenMP/CUDA state
+    ctx = multiprocessing.get_context("spawn")
+    pending = {src: estimate_memory(SRCDIR / src) for src in srcs}
+    # src: (process, memory, position)
+    running: dict[str, tuple[multiprocessing.Process, int, int]] = {}
+    while pending or running:
+        for src, (proc, memory, position) in list(running.items()):
+            if proc.is_alive():
+                running[src] = proc, max(memory, _rss(proc.pid)), position
+                continue
+            proc.join()
+            if proc.exitcode:
+                log.error("%s failed with exit code %d", src, proc.exitcode)
+            del running[src]
+        used = sum(memory for _, memory, _ in running.values())
+        for src, memory in list(pending.items()):
+            if len(running) >= jobs:
+                break
+            if running and (used + memory > memory_budget or memory > psutil.virtual_memory().available):
+                # doesn't fit (yet): try smaller jobs
+                continue
+            position = min(set(range(jobs)) - {pos for _, _, pos in running.values()})
+            log.info("starting %s (~%s, %d threads)", src, tqdm.format_sizeof(memory, 'B', 1024), omp_threads)
+            proc = ctx.Process(target=_evaluate_job, name=src, args=(src, log_level),
+                               kwargs={"omp_threads": omp_threads, "position": position, **kwargs})
+            proc.start()
+            running[src] = proc, memory, position
+            used += memory
+            del pending[src]
+        sleep(poll)
 
 
 if not SRCDIR.is_dir():
@@ -307,8 +1490,12 @@ if not SRCDIR.is_dir():
 else:
     from SIRF_data_preparation.dataset_settings import DATA
 
-if __name__ != "__main__":
-    # load up first data-set for people to play with
+
+def __getattr__(name: str):
+    """Lazily load up the first data-set (as `data` & `metrics`) for people to play with"""
+    if name not in ("data", "metrics"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    global data, metrics
     data, metrics, src = None, [], ""
     if not os.getenv("PETRIC_SKIP_DATA", False):
         src = "NeuroLF_Esser_Dataset" # smallest download
@@ -318,32 +1505,23 @@ if __name__ != "__main__":
         metrics = [MetricsWithTimeout(outdir=OUTDIR / out, **settings.slices, vmax=settings.vmax)]
         data = get_data(srcdir=SRCDIR / src, outdir=OUTDIR / out)
         metrics[0].reset()            # timeout from now
-else:
-    from traceback import print_exc
+    return globals()[name]
+
 
+if __name__ == "__main__":
     from docopt import docopt
     from tqdm.contrib.logging import logging_redirect_tqdm
     args = docopt(__doc__)
-    logging.basicConfig(level=getattr(logging, args["--log"].upper()))
+    log_level = getattr(logging, args["--log"].upper())
+    logging.basicConfig(level=log_level)
     redir = logging_redirect_tqdm()
     redir.__enter__()
-    from main import Submission, submission_callbacks
-    assert issubclass(Submission, Algorithm)
-    for src in DATA.keys():
-        settings = get_settings(src)
-        out = settings.name
-        # NB: `MetricsWithTimeout` contains `SaveIters` which creates `outdir`
-        cbk = MetricsWithTimeout(outdir=OUTDIR / out, **settings.slices, vmax=settings.vmax)
-        data = get_data(srcdir=SRCDIR / src, outdir=OUTDIR / out)
-        if data.reference_image is not None:
-            cbk.callbacks.append(
-                QualityMetrics(data.reference_image, data.whole_object_mask, data.background_mask,
-                               tb_summary_writer=cbk.tb, voi_mask_dict=data.voi_masks))
-        cbk.reset(position=0) # timeout from now
-        algo = Submission(data, update_objective_interval=np.iinfo(np.int32).max)
-        try:
-            algo.run(np.inf, callbacks=submission_callbacks + [cbk])
-        except Exception:
-            print_exc(limit=2)
-        finally:
-            del algo
+    kwargs = {
+        "writers": int(args["--writers"]), "profile": args["--profile"], "memory": args["--memlog"],
+        "tracemalloc": int(args["--tracemalloc"]), "adaptive": args["--adaptive"], "tune_omp": args["--tune-omp"],
+        "storage": args["--storage"], "calibrate_subsets": args["--plan-subsets"]}
+    if (jobs := int(args["--jobs"])) > 1:
+        schedule(DATA.keys(), jobs, memory_budget=float(args["--memory"]) * 1024**3, log_level=log_level, **kwargs)
+    else:
+        for src in DATA.keys():
+            evaluate(src, **kwargs)